@@ -0,0 +1,384 @@
+"""
+BetterTouchTool plumbing shared by the bridge modules.
+
+URL building, dispatch (BTT's webserver, LaunchServices, then `open`),
+AppleScript execution (ScriptingBridge, a long-lived osascript co-process,
+then one-shot osascript) and the cached trigger list live here once instead
+of being copied into each bridge. The module is plain Python with no
+package-relative imports, so it can also be compiled with Cython
+(``cythonize -3 _core.py``) where that pays off.
+"""
+
+import atexit
+import ctypes
+import http.client
+import io
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+import urllib.parse
+from typing import Any, Optional
+
+try:
+    import orjson
+
+    def _json_dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    _json_loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib codec
+    def _json_dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    _json_loads = json.loads
+
+try:  # streaming parser, used when filtering a trigger list that isn't cached
+    import ijson
+except ImportError:
+    ijson = None
+
+try:  # PyObjC, macOS only: talk to BTT with Apple events instead of osascript
+    from ScriptingBridge import SBApplication
+except ImportError:
+    SBApplication = None
+
+logger = logging.getLogger("btt_mcp_bridge")
+
+# ----------------------------------------------------------------------
+# Config
+# ----------------------------------------------------------------------
+
+BTT_SHARED_SECRET: str = os.getenv("BTT_SHARED_SECRET", "")
+# Pre-encoded query suffix appended to every btt:// URL
+_SECRET_SUFFIX: str = (
+    f"&shared_secret={urllib.parse.quote(BTT_SHARED_SECRET, safe='')}" if BTT_SHARED_SECRET else ""
+)
+
+# Port of BTT's built-in webserver (Preferences → Scripting BTT). When it is
+# enabled, btt:// calls become plain HTTP GETs with no process spawn; 0 disables.
+BTT_HTTP_PORT: int = int(os.getenv("BTT_HTTP_PORT", "60393"))
+
+# How long a fetched trigger list is reused before asking BTT again (seconds)
+TRIGGERS_CACHE_TTL: float = float(os.getenv("BTT_TRIGGERS_CACHE_TTL", "60"))
+
+# LaunchServices bindings so btt:// URLs can be dispatched in-process instead of
+# forking /usr/bin/open for every call. Only available on macOS.
+try:
+    _CF = ctypes.CDLL("/System/Library/Frameworks/CoreFoundation.framework/CoreFoundation")
+    _LS = ctypes.CDLL("/System/Library/Frameworks/CoreServices.framework/CoreServices")
+    _CF.CFStringCreateWithCString.restype = ctypes.c_void_p
+    _CF.CFStringCreateWithCString.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_uint32]
+    _CF.CFURLCreateWithString.restype = ctypes.c_void_p
+    _CF.CFURLCreateWithString.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _CF.CFRelease.restype = None
+    _CF.CFRelease.argtypes = [ctypes.c_void_p]
+    _LS.LSOpenCFURLRef.restype = ctypes.c_int32
+    _LS.LSOpenCFURLRef.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+except (OSError, AttributeError):
+    _LS = None
+
+_kCFStringEncodingUTF8 = 0x08000100
+
+# Upper bound on the URL bytes passed to a single `open` command line
+_OPEN_ARGS_LIMIT = 256 * 1024
+
+# Long-lived `osascript -i` co-process shared by _osascript(). Each script is
+# followed by a sentinel expression so we know where its output ends.
+_AS_SENTINEL = "<<<END>>>"
+_AS_PROMPT = ">> "
+# `osascript -i` prints each result in source form after "=> "; strings come
+# back quoted with these backslash escapes
+_AS_RESULT = "=> "
+_AS_ESCAPE_RE = re.compile(r"\\(.)", re.S)
+_AS_ESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+_AS_PROC: Optional[subprocess.Popen] = None
+_AS_LOCK = threading.Lock()
+
+
+def _close_osascript() -> None:
+    if _AS_PROC is not None and _AS_PROC.poll() is None:
+        _AS_PROC.terminate()
+
+
+atexit.register(_close_osascript)
+
+# Idle keep-alive connections to BTT's webserver. Each request takes one (or
+# opens a new one) and hands it back afterwards, so concurrent callers such as
+# add_hotkeys_bulk's workers don't queue behind each other. When the port turns
+# out not to be listening, it is not tried again until _http_retry_at
+# (time.monotonic()).
+_HTTP_POOL: list[http.client.HTTPConnection] = []
+_HTTP_POOL_LOCK = threading.Lock()
+_HTTP_POOL_SIZE = 8  # idle connections kept open
+_HTTP_TIMEOUT = 5.0
+_HTTP_RETRY_BACKOFF = 30.0
+_http_enabled = BTT_HTTP_PORT > 0
+_http_retry_at = 0.0
+
+# What a reused keep-alive connection raises when BTT closed it while it sat
+# idle: the request never reached BTT, so it is safe to send it again
+_STALE_CONN_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+def _close_http_pool() -> None:
+    with _HTTP_POOL_LOCK:
+        while _HTTP_POOL:
+            _HTTP_POOL.pop().close()
+
+
+atexit.register(_close_http_pool)
+
+BTT_BUNDLE_ID = "com.hegenberg.BetterTouchTool"
+_BTT = None  # ScriptingBridge proxy for BTT, created on first use
+
+# Last parsed trigger list and the time.monotonic() it was fetched at
+_triggers_cache: Optional[tuple[list, float]] = None
+
+# ----------------------------------------------------------------------
+# Helper functions
+# ----------------------------------------------------------------------
+
+
+def _build_btt_url(function: str, params: dict[str, str]) -> str:
+    """Return a fully-formed btt:// URL, including shared-secret if set."""
+    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+    return f"btt://{function}/?{query}{_SECRET_SUFFIX}"
+
+
+def _btt_http_get(path: str) -> Optional[str]:
+    """GET *path* from BTT's webserver.
+
+    Returns None, having sent nothing, if the webserver can't be reached, so the
+    caller can use another route. Once the request may have reached BTT, a
+    failure raises OSError instead: falling back then could run the call twice.
+    """
+    global _http_retry_at
+    if not _http_enabled or time.monotonic() < _http_retry_at:
+        return None
+    with _HTTP_POOL_LOCK:
+        conn = _HTTP_POOL.pop() if _HTTP_POOL else None
+    while True:
+        reused = conn is not None
+        if not reused:
+            conn = http.client.HTTPConnection("127.0.0.1", BTT_HTTP_PORT, timeout=_HTTP_TIMEOUT)
+            try:
+                conn.connect()
+            except OSError as e:
+                conn.close()
+                logger.info(f"BTT webserver not reachable on port {BTT_HTTP_PORT} ({e}), "
+                            f"using btt:// URLs for {_HTTP_RETRY_BACKOFF:.0f}s")
+                _http_retry_at = time.monotonic() + _HTTP_RETRY_BACKOFF
+                return None
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = response.read().decode("utf-8")
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            if reused and isinstance(e, _STALE_CONN_ERRORS):
+                conn = None  # idle connection dropped by BTT; resend on a fresh one
+                continue
+            raise OSError(f"BTT webserver request failed for {path[:50]}: {e}") from e
+        break
+    # Keep the connection only while its socket is still open (the server
+    # didn't ask to close it), so a pooled connection is always a live one
+    with _HTTP_POOL_LOCK:
+        if conn.sock is not None and len(_HTTP_POOL) < _HTTP_POOL_SIZE:
+            _HTTP_POOL.append(conn)
+            conn = None
+    if conn is not None:
+        conn.close()
+    if response.status != 200:
+        raise OSError(f"BTT webserver returned HTTP {response.status} for {path[:50]}")
+    return body
+
+
+def _btt_http_open(url: str) -> bool:
+    """Send a btt:// URL to BTT's webserver. Returns False if that isn't possible.
+
+    Raises OSError if the request may have reached BTT but did not succeed.
+    """
+    # btt://func/?query  ->  GET /func/?query
+    return url.startswith("btt://") and _btt_http_get(url[5:]) is not None
+
+
+def _ls_open(url: str) -> bool:
+    """Open *url* through LaunchServices. Returns False if that isn't possible."""
+    if _LS is None:
+        return False
+    cf_string = _CF.CFStringCreateWithCString(None, url.encode("utf-8"), _kCFStringEncodingUTF8)
+    if not cf_string:
+        return False
+    try:
+        cf_url = _CF.CFURLCreateWithString(None, cf_string, None)
+        if not cf_url:
+            return False
+        try:
+            status = _LS.LSOpenCFURLRef(cf_url, None)
+        finally:
+            _CF.CFRelease(cf_url)
+    finally:
+        _CF.CFRelease(cf_string)
+    if status != 0:
+        raise OSError(f"LSOpenCFURLRef failed with status {status}")
+    return True
+
+
+def _open(url: str) -> None:
+    """macOS-style 'open' on the custom URL scheme."""
+    logger.info(f"Opening URL: {url[:50]}...")
+    try:
+        if _btt_http_open(url) or _ls_open(url):
+            return
+        subprocess.run(["open", url], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Error opening URL: {e}")
+        raise
+
+
+def _open_many(urls: list[str]) -> None:
+    """Open several btt:// URLs, forking `open` at most once per chunk of URLs."""
+    logger.info(f"Opening {len(urls)} URLs")
+    pending = []
+    try:
+        for url in urls:
+            if not (_btt_http_open(url) or _ls_open(url)):
+                pending.append(url)
+        # `open` takes any number of URLs; chunk to stay well below ARG_MAX
+        chunk: list[str] = []
+        size = 0
+        for url in pending:
+            if chunk and size + len(url) > _OPEN_ARGS_LIMIT:
+                subprocess.run(["open", *chunk], check=True)
+                chunk, size = [], 0
+            chunk.append(url)
+            size += len(url) + 1
+        if chunk:
+            subprocess.run(["open", *chunk], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Error opening URLs: {e}")
+        raise
+
+
+def _decode_interactive_result(output: str) -> Optional[str]:
+    """Turn an `osascript -i` result back into what `osascript -e` would print.
+
+    Text and bare values (numbers, booleans, constants) convert exactly; for
+    lists, records and the like None is returned so the caller uses -e.
+    """
+    if not output.startswith(_AS_RESULT):
+        return None
+    value = output[len(_AS_RESULT):].rstrip("\n")
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        text = _AS_ESCAPE_RE.sub(lambda m: _AS_ESCAPES.get(m.group(1), m.group(1)), value[1:-1])
+        return text + "\n"
+    if '"' in value or "{" in value:
+        return None
+    return value + "\n"
+
+
+def _osascript_interactive(source: str) -> Optional[str]:
+    """Run a one-line script on the shared osascript process, or return None."""
+    global _AS_PROC
+    if "\n" in source:
+        return None
+    with _AS_LOCK:
+        try:
+            if _AS_PROC is None or _AS_PROC.poll() is not None:
+                _AS_PROC = subprocess.Popen(
+                    ["osascript", "-i"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    bufsize=1,
+                )
+            _AS_PROC.stdin.write(f'{source}\n"{_AS_SENTINEL}"\n')
+            _AS_PROC.stdin.flush()
+            lines = []
+            for line in _AS_PROC.stdout:
+                if _AS_SENTINEL in line:
+                    break
+                while line.startswith(_AS_PROMPT):
+                    line = line[len(_AS_PROMPT):]
+                lines.append(line)
+            else:
+                # EOF before the sentinel: the process died mid-script
+                _AS_PROC = None
+                return None
+        except OSError:
+            _AS_PROC = None
+            return None
+    # Errors go to stderr, so an empty result means the one-shot path should
+    # run the script again and surface the real error.
+    return _decode_interactive_result("".join(lines))
+
+
+def _osascript(source: str) -> str:
+    """Run AppleScript, capture stdout."""
+    logger.info(f"Running AppleScript: {source[:50]}...")
+    output = _osascript_interactive(source)
+    if output is not None:
+        return output
+    try:
+        return subprocess.check_output(["osascript", "-e", source], text=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error running AppleScript: {e}")
+        raise
+
+
+def _get_triggers_json() -> str:
+    """Return BTT's trigger list as a JSON string."""
+    global _BTT
+    query = f"?{_SECRET_SUFFIX[1:]}" if _SECRET_SUFFIX else ""
+    try:
+        raw = _btt_http_get(f"/get_triggers/{query}")
+    except OSError as e:  # reading is safe to repeat another way
+        logger.warning(f"BTT webserver get_triggers failed, falling back: {e}")
+        raw = None
+    if raw is not None:
+        return raw
+    if SBApplication is not None:
+        try:
+            if _BTT is None:
+                _BTT = SBApplication.applicationWithBundleIdentifier_(BTT_BUNDLE_ID)
+            raw = _BTT.get_triggers() if _BTT is not None else None
+            if raw is not None:
+                return str(raw)
+        except Exception as e:
+            logger.warning(f"ScriptingBridge get_triggers failed, using osascript: {e}")
+    return _osascript('tell application "BetterTouchTool" to get_triggers')
+
+
+def _cached_triggers(app_bundle_id: Optional[str] = None) -> list:
+    """Return the parsed trigger list, reusing it for TRIGGERS_CACHE_TTL seconds.
+
+    If `app_bundle_id` is given only that app's triggers are returned.
+    """
+    global _triggers_cache
+    now = time.monotonic()
+    if _triggers_cache is not None and now - _triggers_cache[1] < TRIGGERS_CACHE_TTL:
+        triggers = _triggers_cache[0]
+    elif app_bundle_id and ijson is not None:
+        # Cold cache and a filter: stream the array and keep only the matches
+        # rather than materializing (and caching) every trigger.
+        raw = _get_triggers_json().encode()
+        return [
+            t for t in ijson.items(io.BytesIO(raw), "item", use_float=True)
+            if t.get("BTTAppBundleIdentifier") == app_bundle_id
+        ]
+    else:
+        triggers = _json_loads(_get_triggers_json())  # BTT returns valid JSON
+        _triggers_cache = (triggers, now)
+    if app_bundle_id:
+        return [t for t in triggers if t.get("BTTAppBundleIdentifier") == app_bundle_id]
+    return list(triggers)
+
+
+def _invalidate_triggers_cache() -> None:
+    global _triggers_cache
+    _triggers_cache = None
@@ -0,0 +1,75 @@
+"""
+Deferred FastMCP construction for the BTT bridges.
+
+Importing fastmcp pulls in a large dependency tree (pydantic, httpx, the MCP
+SDK, ...), which dominates cold start for a stdio tool server. The bridges
+create a ``LazyFastMCP`` instead: it records ``@mcp.tool()`` registrations
+and returns each function unchanged, and only imports fastmcp and builds the
+real server when it is run or otherwise needed.
+"""
+
+import typing
+from typing import Any, Callable, Union
+
+
+class Context:
+    """Stand-in for ``fastmcp.Context`` in tool annotations.
+
+    Swapped for the real class when the server is materialized so FastMCP
+    still injects the request context into ``ctx`` parameters.
+    """
+
+
+def _swap_context(annotation: Any, real: type) -> Any:
+    """Return `annotation` with the placeholder Context replaced by `real`."""
+    if annotation is Context:
+        return real
+    if typing.get_origin(annotation) is Union:
+        return Union[tuple(_swap_context(a, real) for a in typing.get_args(annotation))]
+    return annotation
+
+
+class LazyFastMCP:
+    """Records tool registrations and builds a FastMCP server on first use."""
+
+    def __init__(self, name: str, **settings: Any):
+        self.name = name
+        self._settings = settings
+        self._tools: list[tuple[Callable, tuple, dict]] = []
+        self._server = None
+
+    def tool(self, *args: Any, **kwargs: Any) -> Callable[[Callable], Callable]:
+        def decorator(fn: Callable) -> Callable:
+            self._tools.append((fn, args, kwargs))
+            if self._server is not None:
+                self._register(self._server, fn, args, kwargs)
+            return fn
+        return decorator
+
+    def _register(self, server: Any, fn: Callable, args: tuple, kwargs: dict) -> None:
+        from fastmcp import Context as RealContext
+
+        fn.__annotations__ = {
+            k: _swap_context(v, RealContext) for k, v in fn.__annotations__.items()
+        }
+        server.tool(*args, **kwargs)(fn)
+
+    def materialize(self) -> Any:
+        """Import fastmcp and return the real server, building it once."""
+        if self._server is None:
+            from fastmcp import FastMCP
+
+            server = FastMCP(self.name, **self._settings)
+            for fn, args, kwargs in self._tools:
+                self._register(server, fn, args, kwargs)
+            self._server = server
+        return self._server
+
+    def run(self, *args: Any, **kwargs: Any) -> Any:
+        return self.materialize().run(*args, **kwargs)
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only reached for attributes not defined above
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.materialize(), attr)
@@ -2,16 +2,28 @@
 Smart BetterTouchTool bridge with minimal changes from server.py.
 """
 
-import json
-import os
-import subprocess
-import urllib.parse
+import asyncio
+import itertools
+import secrets
 import sys
 import logging
 from typing import List, Dict, Any, Union
 
-from fastmcp import FastMCP, Context
-from pydantic import Field
+# fastmcp itself is only imported when the server is run (see _mcp_shim)
+try:
+    from ._mcp_shim import LazyFastMCP as FastMCP, Context
+except ImportError:
+    from _mcp_shim import LazyFastMCP as FastMCP, Context
+
+# BTT URL/AppleScript plumbing shared with the other bridges
+try:
+    from ._core import (
+        _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _json_dumps, _open,
+    )
+except ImportError:
+    from _core import (
+        _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _json_dumps, _open,
+    )
 
 # Set up logging to stderr for Claude Desktop to capture
 logging.basicConfig(
@@ -43,6 +55,14 @@ MODIFIER_MASK = {
     "command": 1048576,
 }
 
+# Modifier membership set and precomputed mask for every modifier combination
+_MOD_KEYS = frozenset(MODIFIER_MASK)
+_COMBO_MASK = {
+    frozenset(combo): sum(MODIFIER_MASK[m] for m in combo)
+    for r in range(len(MODIFIER_MASK) + 1)
+    for combo in itertools.combinations(MODIFIER_MASK, r)
+}
+
 # Modifier keycodes
 MODIFIER_KEYCODE = {
     "shift": 56,
@@ -54,11 +74,47 @@ MODIFIER_KEYCODE = {
     "command": 55,
 }
 
-# ----------------------------------------------------------------------
-# Config
-# ----------------------------------------------------------------------
+# Constant fields of a keyboard-shortcut trigger; the None values are filled
+# in per trigger (listed here so the JSON key order stays the same)
+_BASE_TRIGGER = {
+    "BTTTriggerBelongsToPreset": "Default",
+    "BTTActionCategory": 0,
+    "BTTUUID": None,
+    "BTTTriggerType": 0,
+    "BTTTriggerClass": "BTTTriggerTypeKeyboardShortcut",
+    "BTTKeyboardShortcutKeyboardType": 0,
+    "BTTTriggerOnDown": 1,
+    "BTTLayoutIndependentChar": None,
+    "BTTShortcutKeyCode": None,
+    "BTTShortcutModifierKeys": None,
+    "BTTEnabled": 1,
+    "BTTEnabled2": 1,
+    "BTTAutoAdaptToKeyboardLayout": 0,
+    "BTTBelongsToApp": "Global",
+}
+
+_SEND_SHORTCUT_ACTION = {
+    "BTTPredefinedActionType": 110,  # "Send Shortcut"
+    "BTTPredefinedActionName": "Send Shortcut",
+}
+
+# Action fields for each supported predefined_action
+_PREDEFINED_ACTIONS = {
+    "move_right_space": {
+        "BTTPredefinedActionType": 114,
+        "BTTPredefinedActionName": "Move Right a Space",
+    },
+    "move_left_space": {
+        "BTTPredefinedActionType": 113,
+        "BTTPredefinedActionName": "Move Left a Space",
+    },
+    "run_script": {
+        "BTTPredefinedActionType": 206,  # Execute Shell Script or Task
+        "BTTPredefinedActionName": "Execute Shell Script  or  Task",
+        "BTTShellTaskActionConfig": "/bin/bash:::-c:::-:::",
+    },
+}
 
-BTT_SHARED_SECRET: str = os.getenv("BTT_SHARED_SECRET", "")
 mcp = FastMCP("SmartBTT")
 
 # ----------------------------------------------------------------------
@@ -66,39 +122,12 @@ mcp = FastMCP("SmartBTT")
 # ----------------------------------------------------------------------
 
 
-def _build_btt_url(function: str, params: dict[str, str]) -> str:
-    """Return a fully-formed btt:// URL, including shared-secret if set."""
-    if BTT_SHARED_SECRET:
-        params["shared_secret"] = BTT_SHARED_SECRET
-    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
-    return f"btt://{function}/?{query}"
-
-
-def _open(url: str) -> None:
-    """macOS-style 'open' on the custom URL scheme."""
-    logger.info(f"Opening URL: {url[:50]}...")
-    try:
-        subprocess.run(["open", url], check=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error opening URL: {e}")
-        raise
-
-
-def _osascript(source: str) -> str:
-    """Run AppleScript, capture stdout."""
-    logger.info(f"Running AppleScript: {source[:50]}...")
-    try:
-        return subprocess.check_output(["osascript", "-e", source], text=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error running AppleScript: {e}")
-        raise
-
-
 def _split_combo(combo: str) -> tuple[list[str], str]:
     """Return (modifiers, key) from a combo like "ctrl+shift+k"."""
     parts = combo.lower().replace(" ", "").split("+")
-    mods = [p for p in parts if p in MODIFIER_MASK]
-    keys = [p for p in parts if p not in MODIFIER_MASK]
+    mod_keys = _MOD_KEYS  # local: read once instead of per token
+    mods = [p for p in parts if p in mod_keys]
+    keys = [p for p in parts if p not in mod_keys]
     if len(keys) != 1:
         raise ValueError(f"Invalid key combo '{combo}' – could not determine the main key")
     return mods, keys[0]
@@ -109,26 +138,15 @@ def _split_combo(combo: str) -> tuple[list[str], str]:
 # ----------------------------------------------------------------------
 
 
-@mcp.tool()
-def add_hotkey(
+def _build_hotkey_trigger(
     trigger: str,
     send_keys: Union[str, None] = None,
     predefined_action: Union[str, None] = None,
     script: Union[str, None] = None,
-    ctx: Union[Context, None] = None
-) -> str:
-    """Create a keyboard shortcut trigger with either `send_keys` or a simple predefined action.
-    
-    Args:
-        trigger: Keyboard shortcut that activates the trigger, e.g. "shift+cmd+k"
-        send_keys: Keys to send when triggered, e.g. "ctrl+right"; mutually exclusive with predefined_action
-        predefined_action: One of: move_right_space, move_left_space, run_script
-        script: Shell or AppleScript when predefined_action == 'run_script'
-    """
-    
-    # Log the raw values for debugging
-    logger.debug(f"add_hotkey raw values: trigger={trigger!r}, send_keys={send_keys!r}, predefined_action={predefined_action!r}, script={script!r}")
-    
+) -> Dict[str, Any]:
+    """Validate a hotkey spec and return the BTT trigger JSON for it."""
+    # Bind the lookup tables to locals; this runs once per trigger in bulk adds
+    vk = VK_CODES.get
     # Simple validation: exactly one of send_keys or predefined_action must be provided
     has_send_keys = send_keys is not None
     has_predefined = predefined_action is not None
@@ -138,31 +156,15 @@ def add_hotkey(
     if not (has_send_keys ^ has_predefined):  # XOR operator
         raise ValueError("Specify exactly one of send_keys or predefined_action")
 
-    if ctx:
-        ctx.info(f"Adding hotkey trigger: {trigger}")
-    
-    logger.info(f"Adding hotkey trigger: {trigger}")
-
     # Parse trigger (what user presses)
     mods, key = _split_combo(trigger)
 
-    # Build the trigger JSON
-    trigger_json = {
-        "BTTTriggerBelongsToPreset": "Default",
-        "BTTActionCategory": 0,
-        "BTTUUID": os.urandom(16).hex().upper(),
-        "BTTTriggerType": 0,
-        "BTTTriggerClass": "BTTTriggerTypeKeyboardShortcut",
-        "BTTKeyboardShortcutKeyboardType": 0,
-        "BTTTriggerOnDown": 1,
-        "BTTLayoutIndependentChar": key,
-        "BTTShortcutKeyCode": VK_CODES.get(key, 0),
-        "BTTShortcutModifierKeys": sum(MODIFIER_MASK[m] for m in mods),
-        "BTTEnabled": 1,
-        "BTTEnabled2": 1,
-        "BTTAutoAdaptToKeyboardLayout": 0,
-        "BTTBelongsToApp": "Global",
-    }
+    # Build the trigger JSON from the constant template
+    trigger_json = _BASE_TRIGGER.copy()
+    trigger_json["BTTUUID"] = secrets.token_hex(16).upper()
+    trigger_json["BTTLayoutIndependentChar"] = key
+    trigger_json["BTTShortcutKeyCode"] = vk(key, 0)
+    trigger_json["BTTShortcutModifierKeys"] = _COMBO_MASK[frozenset(mods)]
 
     # Action
     if has_send_keys:
@@ -171,45 +173,112 @@ def add_hotkey(
         
         # For shortcut to send, we need a different format
         if len(a_mods) == 0:
-            shortcut_to_send = f"{VK_CODES.get(a_key, 0)}"
+            shortcut_to_send = f"{vk(a_key, 0)}"
         else:
             mod_keycode = MODIFIER_KEYCODE[a_mods[0]]
-            shortcut_to_send = f"{mod_keycode},{VK_CODES.get(a_key, 0)}"
+            shortcut_to_send = f"{mod_keycode},{vk(a_key, 0)}"
             
-        trigger_json.update({
-            "BTTPredefinedActionType": 110,  # "Send Shortcut"
-            "BTTPredefinedActionName": "Send Shortcut",
-            "BTTShortcutToSend": shortcut_to_send,
-        })
+        trigger_json.update(_SEND_SHORTCUT_ACTION)
+        trigger_json["BTTShortcutToSend"] = shortcut_to_send
     else:
-        if predefined_action == "move_right_space":
-            trigger_json.update({
-                "BTTPredefinedActionType": 114,
-                "BTTPredefinedActionName": "Move Right a Space",
-            })
-        elif predefined_action == "move_left_space":
-            trigger_json.update({
-                "BTTPredefinedActionType": 113,
-                "BTTPredefinedActionName": "Move Left a Space",
-            })
-        elif predefined_action == "run_script":
-            if not script:
-                raise ValueError("'script' must be provided when predefined_action == 'run_script'")
-            trigger_json.update({
-                "BTTPredefinedActionType": 206,  # Execute Shell Script or Task
-                "BTTPredefinedActionName": "Execute Shell Script  or  Task",
-                "BTTShellTaskActionScript": script,
-                "BTTShellTaskActionConfig": "/bin/bash:::-c:::-:::",
-            })
-        else:
+        action = _PREDEFINED_ACTIONS.get(predefined_action)
+        if action is None:
             raise ValueError(f"Unsupported predefined_action: {predefined_action}")
+        if predefined_action == "run_script" and not script:
+            raise ValueError("'script' must be provided when predefined_action == 'run_script'")
+        trigger_json.update(action)
+        if predefined_action == "run_script":
+            trigger_json["BTTShellTaskActionScript"] = script
+
+    return trigger_json
+
+
+@mcp.tool()
+def add_hotkey(
+    trigger: str,
+    send_keys: Union[str, None] = None,
+    predefined_action: Union[str, None] = None,
+    script: Union[str, None] = None,
+    ctx: Union[Context, None] = None
+) -> str:
+    """Create a keyboard shortcut trigger with either `send_keys` or a simple predefined action.
+    
+    Args:
+        trigger: Keyboard shortcut that activates the trigger, e.g. "shift+cmd+k"
+        send_keys: Keys to send when triggered, e.g. "ctrl+right"; mutually exclusive with predefined_action
+        predefined_action: One of: move_right_space, move_left_space, run_script
+        script: Shell or AppleScript when predefined_action == 'run_script'
+    """
+    
+    # Log the raw values for debugging
+    logger.debug(f"add_hotkey raw values: trigger={trigger!r}, send_keys={send_keys!r}, predefined_action={predefined_action!r}, script={script!r}")
+    
+    if ctx:
+        ctx.info(f"Adding hotkey trigger: {trigger}")
+    
+    logger.info(f"Adding hotkey trigger: {trigger}")
+
+    trigger_json = _build_hotkey_trigger(trigger, send_keys, predefined_action, script)
 
     # Send to BTT
-    json_payload = json.dumps(trigger_json, ensure_ascii=False)
+    json_payload = _json_dumps(trigger_json)
     _open(_build_btt_url("add_new_trigger", {"json": json_payload}))
+    _invalidate_triggers_cache()
     return f"Trigger {trigger_json['BTTUUID']} added"
 
 
+@mcp.tool()
+async def add_hotkeys_bulk(
+    specs: List[Dict[str, Any]],
+    max_concurrent: int = 8,
+    ctx: Union[Context, None] = None
+) -> List[str]:
+    """Create several keyboard shortcut triggers in one call.
+
+    Args:
+        specs: List of hotkey specs, each a dict with the same keys as `add_hotkey`
+            (trigger, send_keys, predefined_action, script)
+        max_concurrent: Maximum number of URLs handed to BTT at the same time
+    """
+    if max_concurrent < 1:
+        raise ValueError("max_concurrent must be at least 1")
+
+    # Validate and build every trigger before sending anything to BTT
+    triggers = []
+    for i, spec in enumerate(specs):
+        if "trigger" not in spec:
+            raise ValueError(f"Hotkey spec {i} has no 'trigger': {spec!r}")
+        triggers.append(_build_hotkey_trigger(
+            spec["trigger"],
+            spec.get("send_keys"),
+            spec.get("predefined_action"),
+            spec.get("script"),
+        ))
+
+    if ctx:
+        await ctx.info(f"Adding {len(triggers)} hotkey triggers")
+
+    logger.info(f"Adding {len(triggers)} hotkey triggers")
+
+    # Dispatch the URLs from a queue with at most max_concurrent in flight
+    queue: asyncio.Queue = asyncio.Queue()
+    for t in triggers:
+        queue.put_nowait(_build_btt_url("add_new_trigger", {"json": _json_dumps(t)}))
+
+    loop = asyncio.get_running_loop()
+
+    async def worker() -> None:
+        while not queue.empty():
+            url = queue.get_nowait()
+            await loop.run_in_executor(None, _open, url)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(max_concurrent, len(triggers)))))
+    finally:
+        _invalidate_triggers_cache()
+    return [f"Trigger {t['BTTUUID']} added" for t in triggers]
+
+
 @mcp.tool()
 def list_triggers(ctx: Union[Context, None] = None) -> List[Dict[str, Any]]:
     """Return the current BTT trigger list."""
@@ -217,8 +286,7 @@ def list_triggers(ctx: Union[Context, None] = None) -> List[Dict[str, Any]]:
         ctx.info("Listing all BTT triggers")
     
     logger.info("Listing all BTT triggers")
-    raw = _osascript('tell application "BetterTouchTool" to get_triggers')
-    triggers = json.loads(raw)
+    triggers = _cached_triggers()
     logger.info(f"Found {len(triggers)} triggers")
     return triggers
 
@@ -231,6 +299,7 @@ def delete_trigger(uuid: str, ctx: Union[Context, None] = None) -> str:
     
     logger.info(f"Deleting trigger {uuid}")
     _open(_build_btt_url("delete_trigger", {"uuid": uuid}))
+    _invalidate_triggers_cache()
     return f"Trigger {uuid} deleted"
 
 
@@ -6,7 +6,6 @@ This provides better response handling to prevent timeouts.
 
 import os
 import sys
-import importlib.util
 import logging
 
 # Set up logging to stderr to help with debugging
@@ -17,19 +16,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger("btt_mcp_bridge")
 
-# Get the directory of this script
-current_dir = os.path.dirname(os.path.abspath(__file__))
+# When run as a script, make the package importable from its parent directory
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Path to the server.py file
-server_path = os.path.join(current_dir, "server.py")
+logger.info("Loading btt_mcp_bridge.server")
 
-logger.info(f"Loading server from {server_path}")
-
-# Import the server.py module
-spec = importlib.util.spec_from_file_location("server", server_path)
-server = importlib.util.module_from_spec(spec)
-sys.modules["server"] = server
-spec.loader.exec_module(server)
+from btt_mcp_bridge import server
 
 # Export the MCP object directly so Claude can find it
 # This is the key part - Claude looks for a FastMCP object named mcp, server, or app
@@ -6,21 +6,15 @@ This script is used by Claude Desktop to run the server without requiring uv.
 
 import sys
 import os
-import importlib.util
+
+# When run as a script, make the package importable from its parent directory
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 def main():
     """Import and run the server module directly."""
-    # Get the directory of this script
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Path to the server.py file
-    server_path = os.path.join(current_dir, "server.py")
-    
-    # Import the server.py module
-    spec = importlib.util.spec_from_file_location("server", server_path)
-    server = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(server)
-    
+    from btt_mcp_bridge import server
+
     # Run the MCP server
     server.mcp.run()
 
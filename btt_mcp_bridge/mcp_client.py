@@ -25,15 +25,31 @@ class BTTClient:
         """
         self.server_path = server_path
         self.client = Client(server_path)
+        self._connected = False
+    
+    async def connect(self) -> None:
+        """
+        Start the server session. The same session is reused by every call
+        until disconnect(), so the server process and MCP handshake are paid once.
+        """
+        if not self._connected:
+            await self.client.__aenter__()
+            self._connected = True
+    
+    async def disconnect(self, exc_type=None, exc_val=None, exc_tb=None) -> None:
+        """Close the server session if it is open."""
+        if self._connected:
+            self._connected = False
+            await self.client.__aexit__(exc_type, exc_val, exc_tb)
     
     async def __aenter__(self):
         """Async context manager entry."""
-        await self.client.__aenter__()
+        await self.connect()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit."""
-        await self.client.__aexit__(exc_type, exc_val, exc_tb)
+        await self.disconnect(exc_type, exc_val, exc_tb)
     
     async def add_trigger(self, trigger_json: str) -> str:
         """
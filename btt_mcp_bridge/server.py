@@ -6,16 +6,21 @@ Start the server with:
     python direct_runner.py    # or: python server.py
 """
 
-import json
-import os
-import subprocess
-import urllib.parse
 import sys
 import logging
 from typing import List, Optional
 
-from fastmcp import FastMCP, Context
-from pydantic import Field
+# fastmcp itself is only imported when the server is run (see _mcp_shim)
+try:
+    from ._mcp_shim import LazyFastMCP as FastMCP, Context
+except ImportError:
+    from _mcp_shim import LazyFastMCP as FastMCP, Context
+
+# BTT URL/AppleScript plumbing shared with the other bridges
+try:
+    from ._core import _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _open
+except ImportError:
+    from _core import _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _open
 
 # Set up logging to stderr for Claude Desktop to capture
 logging.basicConfig(
@@ -25,45 +30,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger("btt_server")
 
-# ----------------------------------------------------------------------
-# Config
-# ----------------------------------------------------------------------
-
-BTT_SHARED_SECRET: str = os.getenv("BTT_SHARED_SECRET", "")
 mcp = FastMCP("BTTBridge")
 
-# ----------------------------------------------------------------------
-# Helper functions
-# ----------------------------------------------------------------------
-
-
-def _build_btt_url(function: str, params: dict[str, str]) -> str:
-    """Return a fully-formed btt:// URL, including shared-secret if set."""
-    if BTT_SHARED_SECRET:
-        params["shared_secret"] = BTT_SHARED_SECRET
-    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
-    return f"btt://{function}/?{query}"
-
-
-def _open(url: str) -> None:
-    """macOS-style 'open' on the custom URL scheme."""
-    logger.info(f"Opening URL: {url}")
-    try:
-        subprocess.run(["open", url], check=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error opening URL: {e}")
-        raise
-
-
-def _osascript(source: str) -> str:
-    """Run AppleScript, capture stdout."""
-    logger.info(f"Running AppleScript: {source[:50]}...")
-    try:
-        return subprocess.check_output(["osascript", "-e", source], text=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error running AppleScript: {e}")
-        raise
-
 
 # ----------------------------------------------------------------------
 # MCP tools
@@ -83,6 +51,7 @@ def add_btt_trigger(trigger_json: str, ctx: Context = None) -> str:
         
     logger.info(f"Adding new BTT trigger: {trigger_json[:50]}...")
     _open(_build_btt_url("add_new_trigger", {"json": trigger_json}))
+    _invalidate_triggers_cache()
     return "Trigger added successfully."
 
 
@@ -105,6 +74,7 @@ def update_btt_trigger(uuid: str, patch_json: str, ctx: Context = None) -> str:
             {"uuid": uuid, "json": patch_json},
         )
     )
+    _invalidate_triggers_cache()
     return "Trigger updated."
 
 
@@ -121,6 +91,7 @@ def delete_btt_trigger(uuid: str, ctx: Context = None) -> str:
         
     logger.info(f"Deleting BTT trigger {uuid}")
     _open(_build_btt_url("delete_trigger", {"uuid": uuid}))
+    _invalidate_triggers_cache()
     return "Trigger deleted."
 
 
@@ -136,13 +107,7 @@ def list_btt_triggers(app_bundle_id: Optional[str] = None, ctx: Context = None)
         ctx.info(f"Listing BTT triggers {f'for app: {app_bundle_id}' if app_bundle_id else ''}")
         
     logger.info(f"Listing BTT triggers {f'for app: {app_bundle_id}' if app_bundle_id else ''}")
-    raw = _osascript('tell application "BetterTouchTool" to get_triggers')
-    triggers = json.loads(raw)  # BTT returns valid JSON
-    
-    if app_bundle_id:
-        triggers = [
-            t for t in triggers if t.get("BTTAppBundleIdentifier") == app_bundle_id
-        ]
+    triggers = _cached_triggers(app_bundle_id)
     
     logger.info(f"Found {len(triggers)} triggers")
     return triggers
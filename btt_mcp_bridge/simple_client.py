@@ -1,16 +1,23 @@
 #!/usr/bin/env python3
 """
-Simple client for BTT MCP using direct shell commands.
+Simple client for BTT MCP using the fastmcp CLI over stdio.
 """
 import json
+import os
+import shutil
 import subprocess
 import sys
+from pathlib import Path
 
-def run_command(command):
-    """Run a shell command and return the output."""
+# Prefer the fastmcp script installed alongside this interpreter
+FASTMCP = shutil.which("fastmcp", path=os.path.dirname(sys.executable)) or "fastmcp"
+SERVER_PATH = str(Path(__file__).with_name("server.py"))
+
+def run_request(request):
+    """Pipe a JSON-RPC request straight into `fastmcp run` and return its output."""
     process = subprocess.run(
-        command,
-        shell=True,
+        [FASTMCP, "run", SERVER_PATH, "--transport", "stdio"],
+        input=json.dumps(request),
         capture_output=True,
         text=True
     )
@@ -30,12 +37,8 @@ def main():
         "method": "list_btt_triggers"
     }
     
-    # Write request to a temp file
-    with open("request.json", "w") as f:
-        json.dump(request, f)
-    
     # Send the request using fastmcp
-    result = run_command("cat request.json | fastmcp run server.py --transport stdio")
+    result = run_request(request)
     
     try:
         # Parse the response
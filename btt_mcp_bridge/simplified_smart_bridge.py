@@ -7,17 +7,27 @@ A version of the smart bridge without Context parameters to avoid import issues.
 
 from __future__ import annotations
 
+import functools
+import itertools
 import json
-import os
-import subprocess
-import uuid
-import urllib.parse
+import operator
+import secrets
 import sys
 import logging
 import traceback
+import types
 
 from fastmcp import FastMCP
-from pydantic import Field
+
+# URL building and dispatch shared with the other bridges
+try:
+    from ._core import (
+        _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _open, _open_many,
+    )
+except ImportError:
+    from _core import (
+        _build_btt_url, _cached_triggers, _invalidate_triggers_cache, _open, _open_many,
+    )
 
 # Set up logging to stderr for Claude Desktop to capture
 logging.basicConfig(
@@ -28,21 +38,25 @@ logging.basicConfig(
 logger = logging.getLogger("simplified_smart_bridge")
 
 # Log Python version and module paths to help with debugging
-logger.debug(f"Python version: {sys.version}")
-logger.debug(f"Sys path: {sys.path}")
-logger.debug(f"Starting Simplified Smart BTT Bridge initialization")
+logger.debug("Python version: %s", sys.version)
+logger.debug("Sys path: %s", sys.path)
+logger.debug("Starting Simplified Smart BTT Bridge initialization")
 
 ###############################################################################
 # 1.  CONSTANTS & LOOK-UP TABLES                                              #
 ###############################################################################
-# macOS virtual key codes (incomplete but covers common keys)
-VK_CODES = {
+# Key codes for "a".."z" and "0".."9", indexed by ord(key) - ord("a") / ord("0")
+_LETTER_VK = bytes((
+    0, 11, 8, 2, 14, 3, 5, 4, 34, 38, 40, 37, 46, 45, 31, 35, 12, 15,
+    1, 17, 32, 9, 13, 7, 16, 6))
+_DIGIT_VK = bytes((18, 19, 20, 21, 23, 22, 26, 28, 25, 29))
+
+# macOS virtual key codes (incomplete but covers common keys); read-only
+VK_CODES = types.MappingProxyType({
     # letters
-    **{chr(i): code for i, code in zip(range(ord("a"), ord("z") + 1), (
-        0, 11, 8, 2, 14, 3, 5, 4, 34, 38, 40, 37, 46, 45, 31, 35, 12, 15,
-        1, 17, 32, 9, 13, 7, 16, 6))},
+    **{chr(ord("a") + i): code for i, code in enumerate(_LETTER_VK)},
     # digits
-    **{str(i): code for i, code in zip(range(10), (18, 19, 20, 21, 23, 22, 26, 28, 25, 29))},
+    **{str(i): code for i, code in enumerate(_DIGIT_VK)},
     # arrows
     "left": 123,
     "right": 124,
@@ -55,7 +69,7 @@ VK_CODES = {
     "space": 49,
     "tab": 48,
     "delete": 51,
-}
+})
 
 # CGEventFlags bit-masks (what BTT uses in BTTShortcutModifierKeys)
 MODIFIER_MASK = {
@@ -81,128 +95,123 @@ MODIFIER_KEYCODE = {
     "command": 55,
 }
 
-###############################################################################
-# 2.  LOW-LEVEL HELPERS                                                       #
-###############################################################################
-
-BTT_SHARED_SECRET: str = os.getenv("BTT_SHARED_SECRET", "")
-logger.debug(f"BTT_SHARED_SECRET is {'set' if BTT_SHARED_SECRET else 'not set'}")
-
-
-def _build_btt_url(func: str, params: dict[str, str]) -> str:
-    """Return a fully-formed btt:// URL, including shared-secret if set."""
-    if BTT_SHARED_SECRET:
-        params["shared_secret"] = BTT_SHARED_SECRET
-    query = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
-    url = f"btt://{func}/?{query}"
-    logger.debug(f"Built BTT URL: {url[:50]}...")
-    return url
+# Constant fields of a keyboard-shortcut trigger; the None values are filled
+# in per trigger (listed here so the JSON key order stays the same)
+_BASE_TRIGGER = {
+    "BTTTriggerBelongsToPreset": "Default",
+    "BTTActionCategory": 0,
+    "BTTUUID": None,
+    "BTTTriggerType": 0,
+    "BTTTriggerClass": "BTTTriggerTypeKeyboardShortcut",
+    "BTTKeyboardShortcutKeyboardType": 0,
+    "BTTTriggerOnDown": 1,
+    "BTTLayoutIndependentChar": None,
+    "BTTShortcutKeyCode": None,
+    "BTTShortcutModifierKeys": None,
+    "BTTEnabled": 1,
+    "BTTEnabled2": 1,
+    "BTTAutoAdaptToKeyboardLayout": 0,
+    "BTTBelongsToApp": "Global",
+}
 
+_SEND_SHORTCUT_ACTION = {
+    "BTTPredefinedActionType": 110,  # "Send Shortcut"
+    "BTTPredefinedActionName": "Send Shortcut",
+}
 
-def _open(url: str) -> None:
-    """macOS-style 'open' on the custom URL scheme."""
-    logger.info(f"Opening URL: {url[:50]}...")
-    try:
-        subprocess.run(["open", url], check=True)
-        logger.debug("URL opened successfully")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error opening URL: {e}")
-        logger.error(f"Command output: {e.output if hasattr(e, 'output') else 'No output'}")
-        raise
+# Action fields for each supported predefined_action
+_PREDEFINED_ACTIONS = {
+    "move_right_space": {
+        "BTTPredefinedActionType": 114,
+        "BTTPredefinedActionName": "Move Right a Space",
+    },
+    "move_left_space": {
+        "BTTPredefinedActionType": 113,
+        "BTTPredefinedActionName": "Move Left a Space",
+    },
+    "run_script": {
+        "BTTPredefinedActionType": 206,  # Execute Shell Script or Task
+        "BTTPredefinedActionName": "Execute Shell Script  or  Task",
+        "BTTShellTaskActionConfig": "/bin/bash:::-c:::-:::",
+    },
+}
 
+# Membership set for telling modifiers apart from the main key
+_MOD_SET = frozenset(MODIFIER_MASK)
 
-def _osascript(cmd: str) -> str:
-    """Run AppleScript, capture stdout."""
-    logger.info(f"Running AppleScript: {cmd[:50]}...")
-    try:
-        output = subprocess.check_output(["osascript", "-e", cmd], text=True)
-        logger.debug(f"AppleScript output: {output[:100]}...")
-        return output
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error running AppleScript: {e}")
-        logger.error(f"Command output: {e.output if hasattr(e, 'output') else 'No output'}")
-        raise
+# OR-ed mask for every combination of modifier names (aliases like ctrl+control
+# collapse to one bit); at most 2**8 entries
+_MOD_COMBO_MASK = {
+    frozenset(combo): functools.reduce(operator.or_, (MODIFIER_MASK[m] for m in combo), 0)
+    for r in range(len(MODIFIER_MASK) + 1)
+    for combo in itertools.combinations(MODIFIER_MASK, r)
+}
 
+###############################################################################
+# 2.  LOW-LEVEL HELPERS                                                       #
+###############################################################################
+# btt:// URL building, dispatch and the cached trigger list come from _core
+# (imported above)
 
 ###############################################################################
 # 3.  PARSERS – HUMAN → BTT                                                   #
 ###############################################################################
 
-def _split_combo(combo: str) -> tuple[list[str], str]:
+# The parsers below are pure and only ever see a handful of distinct combos, so
+# results are memoized; modifiers are returned as tuples to stay hashable.
+
+@functools.lru_cache(maxsize=1024)
+def _split_combo(combo: str) -> tuple[tuple[str, ...], str]:
     """Return (modifiers, key) from a combo like "ctrl+shift+k"."""
-    logger.debug(f"Splitting key combo: {combo}")
+    logger.debug("Splitting key combo: %s", combo)
     parts = combo.lower().replace(" ", "").split("+")
-    mods = [p for p in parts if p in MODIFIER_MASK]
-    keys = [p for p in parts if p not in MODIFIER_MASK]
+    mods = tuple(p for p in parts if p in _MOD_SET)
+    keys = [p for p in parts if p not in _MOD_SET]
     if len(keys) != 1:
         logger.error(f"Invalid key combo: {combo}, parts: {parts}, mods: {mods}, keys: {keys}")
         raise ValueError(f"Invalid key combo '{combo}' – could not determine the main key")
-    logger.debug(f"Split result - modifiers: {mods}, key: {keys[0]}")
+    logger.debug("Split result - modifiers: %s, key: %s", mods, keys[0])
     return mods, keys[0]
 
 
+@functools.lru_cache(maxsize=1024)
 def to_keycode(key: str) -> int:
-    logger.debug(f"Converting key to keycode: {key}")
+    # Single letters and digits come straight from the byte tables
+    if len(key) == 1:
+        c = ord(key)
+        if 97 <= c <= 122:
+            return _LETTER_VK[c - 97]
+        if 48 <= c <= 57:
+            return _DIGIT_VK[c - 48]
+    logger.debug("Converting key to keycode: %s", key)
     if key in VK_CODES:
         keycode = VK_CODES[key]
-        logger.debug(f"Key {key} mapped to keycode {keycode}")
+        logger.debug("Key %s mapped to keycode %s", key, keycode)
         return keycode
     logger.error(f"Unsupported key: {key}")
     raise ValueError(f"Unsupported key '{key}' – add it to VK_CODES if needed")
 
 
-def to_modifier_mask(mods: list[str]) -> int:
-    logger.debug(f"Converting modifiers to mask: {mods}")
-    mask = sum(MODIFIER_MASK[m] for m in mods)
-    logger.debug(f"Modifiers {mods} mapped to mask {mask}")
-    return mask
-
+def to_modifier_mask(mods: tuple[str, ...]) -> int:
+    return _MOD_COMBO_MASK[frozenset(mods)]
 
-def to_shortcut_send(mods: list[str], key: str) -> str:
-    logger.debug(f"Converting to shortcut send format - modifiers: {mods}, key: {key}")
-    if len(mods) == 0:
-        result = f"{to_keycode(key)}"
-        logger.debug(f"No modifiers, shortcut: {result}")
-        return result
-    # Pick first modifier for the modifier keycode (left variant)
-    mod_keycode = MODIFIER_KEYCODE[mods[0]]
-    result = f"{mod_keycode},{to_keycode(key)}"
-    logger.debug(f"With modifiers, shortcut: {result}")
-    return result
 
 ###############################################################################
-# 5.  MCP SERVER & TOOLS                                                      #
+# 4.  TRIGGER BUILDER                                                         #
 ###############################################################################
 
-logger.debug("Creating FastMCP instance")
-mcp = FastMCP("SimplifiedSmartBTT")
-logger.debug("FastMCP instance created successfully")
-
-
-@mcp.tool()
-def add_hotkey(
+def _build_hotkey_trigger(
     trigger: str,
-    send_keys = None,
-    predefined_action = None,
-    script = None,
-) -> str:
-    """Create a keyboard shortcut trigger with either `send_keys` or a simple predefined action.
-    
-    Args:
-        trigger: Keyboard shortcut that activates the trigger, e.g. "shift+cmd+k"
-        send_keys: Keys to send when triggered, e.g. "ctrl+right"; mutually exclusive with predefined_action
-        predefined_action: One of: move_right_space, move_left_space, run_script
-        script: Shell or AppleScript when predefined_action == 'run_script'
-    """
-    
-    # Log the raw values for debugging
-    logger.debug(f"add_hotkey raw values: trigger={trigger!r}, send_keys={send_keys!r}, predefined_action={predefined_action!r}, script={repr(script) if script else None}")
-    
+    send_keys: str | None = None,
+    predefined_action: str | None = None,
+    script: str | None = None,
+) -> dict:
+    """Validate a hotkey spec and return the BTT trigger JSON for it."""
     # Simple validation: exactly one of send_keys or predefined_action must be provided
     has_send_keys = send_keys is not None
     has_predefined = predefined_action is not None
     
-    logger.debug(f"Has send_keys: {has_send_keys}, Has predefined: {has_predefined}")
+    logger.debug("Has send_keys: %s, Has predefined: %s", has_send_keys, has_predefined)
     
     if not (has_send_keys ^ has_predefined):  # XOR operator
         logger.error(f"Validation error: Both or neither of send_keys and predefined_action were provided")
@@ -218,67 +227,88 @@ def add_hotkey(
         logger.error(traceback.format_exc())
         raise
 
-    trigger_json = {
-        "BTTTriggerBelongsToPreset": "Default",
-        "BTTActionCategory": 0,
-        "BTTUUID": str(uuid.uuid4()).upper(),
-        "BTTTriggerType": 0,
-        "BTTTriggerClass": "BTTTriggerTypeKeyboardShortcut",
-        "BTTKeyboardShortcutKeyboardType": 0,
-        "BTTTriggerOnDown": 1,
-        "BTTLayoutIndependentChar": key,
-        "BTTShortcutKeyCode": to_keycode(key),
-        "BTTShortcutModifierKeys": to_modifier_mask(mods),
-        "BTTEnabled": 1,
-        "BTTEnabled2": 1,
-        "BTTAutoAdaptToKeyboardLayout": 0,
-        "BTTBelongsToApp": "Global",
-    }
+    trigger_keycode = to_keycode(key)
+
+    # Build the trigger JSON from the constant template
+    trigger_json = _BASE_TRIGGER.copy()
+    trigger_json["BTTUUID"] = secrets.token_hex(16).upper()
+    trigger_json["BTTLayoutIndependentChar"] = key
+    trigger_json["BTTShortcutKeyCode"] = trigger_keycode
+    trigger_json["BTTShortcutModifierKeys"] = to_modifier_mask(mods)
 
     # Action
     if has_send_keys:
+        # Reuse the trigger's parse and key code when send_keys repeats them
         try:
-            a_mods, a_key = _split_combo(send_keys)
+            a_mods, a_key = (mods, key) if send_keys == trigger else _split_combo(send_keys)
         except ValueError as e:
             logger.error(f"Error parsing send_keys: {e}")
             logger.error(traceback.format_exc())
             raise
+        a_keycode = trigger_keycode if a_key == key else to_keycode(a_key)
+
+        # BTTShortcutToSend is "<key code>" or "<modifier key code>,<key code>",
+        # using the first modifier's (left) key code
+        if a_mods:
+            shortcut_to_send = f"{MODIFIER_KEYCODE[a_mods[0]]},{a_keycode}"
+        else:
+            shortcut_to_send = f"{a_keycode}"
+        logger.debug("Shortcut to send: %s", shortcut_to_send)
             
-        trigger_json.update({
-            "BTTPredefinedActionType": 110,  # "Send Shortcut"
-            "BTTPredefinedActionName": "Send Shortcut",
-            "BTTShortcutToSend": to_shortcut_send(a_mods, a_key),
-        })
+        trigger_json.update(_SEND_SHORTCUT_ACTION)
+        trigger_json["BTTShortcutToSend"] = shortcut_to_send
     else:
-        if predefined_action == "move_right_space":
-            trigger_json.update({
-                "BTTPredefinedActionType": 114,
-                "BTTPredefinedActionName": "Move Right a Space",
-            })
-        elif predefined_action == "move_left_space":
-            trigger_json.update({
-                "BTTPredefinedActionType": 113,
-                "BTTPredefinedActionName": "Move Left a Space",
-            })
-        elif predefined_action == "run_script":
-            if not script:
-                logger.error("Missing script for run_script action")
-                raise ValueError("'script' must be provided when predefined_action == 'run_script'")
-            trigger_json.update({
-                "BTTPredefinedActionType": 206,  # Execute Shell Script or Task
-                "BTTPredefinedActionName": "Execute Shell Script  or  Task",
-                "BTTShellTaskActionScript": script,
-                "BTTShellTaskActionConfig": "/bin/bash:::-c:::-:::",
-            })
-        else:
+        action = _PREDEFINED_ACTIONS.get(predefined_action)
+        if action is None:
             logger.error(f"Unsupported predefined_action: {predefined_action}")
             raise ValueError(f"Unsupported predefined_action: {predefined_action}")
+        if predefined_action == "run_script" and not script:
+            logger.error("Missing script for run_script action")
+            raise ValueError("'script' must be provided when predefined_action == 'run_script'")
+        trigger_json.update(action)
+        if predefined_action == "run_script":
+            trigger_json["BTTShellTaskActionScript"] = script
+
+    return trigger_json
+
+
+###############################################################################
+# 5.  MCP SERVER & TOOLS                                                      #
+###############################################################################
+
+logger.debug("Creating FastMCP instance")
+mcp = FastMCP("SimplifiedSmartBTT")
+logger.debug("FastMCP instance created successfully")
+
+
+@mcp.tool()
+def add_hotkey(
+    trigger: str,
+    send_keys = None,
+    predefined_action = None,
+    script = None,
+) -> str:
+    """Create a keyboard shortcut trigger with either `send_keys` or a simple predefined action.
+    
+    Args:
+        trigger: Keyboard shortcut that activates the trigger, e.g. "shift+cmd+k"
+        send_keys: Keys to send when triggered, e.g. "ctrl+right"; mutually exclusive with predefined_action
+        predefined_action: One of: move_right_space, move_left_space, run_script
+        script: Shell or AppleScript when predefined_action == 'run_script'
+    """
+    
+    # Log the raw values for debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"add_hotkey raw values: trigger={trigger!r}, send_keys={send_keys!r}, predefined_action={predefined_action!r}, script={repr(script) if script else None}")
+    
+    trigger_json = _build_hotkey_trigger(trigger, send_keys, predefined_action, script)
 
     # Send to BTT
     try:
         json_payload = json.dumps(trigger_json, ensure_ascii=False)
-        logger.debug(f"Trigger JSON: {json_payload[:100]}...")
+        logger.debug("Trigger JSON: %.100s...", json_payload)
         _open(_build_btt_url("add_new_trigger", {"json": json_payload}))
+        _invalidate_triggers_cache()
         return f"Trigger {trigger_json['BTTUUID']} added"
     except Exception as e:
         logger.error(f"Error adding trigger: {e}")
@@ -286,6 +316,48 @@ def add_hotkey(
         raise
 
 
+@mcp.tool()
+def bulk_add_hotkeys(triggers_json: str) -> list:
+    """Create several keyboard shortcut triggers in one call.
+    
+    Args:
+        triggers_json: JSON array of hotkey specs, each an object with the same keys as
+            `add_hotkey` (trigger, send_keys, predefined_action, script)
+    """
+    logger.debug("bulk_add_hotkeys called")
+    
+    specs = json.loads(triggers_json)
+    if not isinstance(specs, list):
+        raise ValueError("triggers_json must be a JSON array of hotkey specs")
+    
+    # Validate and build every trigger before sending anything to BTT
+    triggers = []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Hotkey spec {i} is not an object: {spec!r}")
+        if "trigger" not in spec:
+            raise ValueError(f"Hotkey spec {i} has no 'trigger': {spec!r}")
+        triggers.append(_build_hotkey_trigger(
+            spec["trigger"],
+            spec.get("send_keys"),
+            spec.get("predefined_action"),
+            spec.get("script"),
+        ))
+    
+    logger.info(f"Adding {len(triggers)} hotkey triggers")
+    try:
+        _open_many([
+            _build_btt_url("add_new_trigger", {"json": json.dumps(t, ensure_ascii=False)})
+            for t in triggers
+        ])
+        _invalidate_triggers_cache()
+        return [f"Trigger {t['BTTUUID']} added" for t in triggers]
+    except Exception as e:
+        logger.error(f"Error adding triggers: {e}")
+        logger.error(traceback.format_exc())
+        raise
+
+
 @mcp.tool()
 def list_triggers() -> list:
     """Return the current BTT trigger list."""
@@ -293,9 +365,8 @@ def list_triggers() -> list:
     
     logger.info("Listing all BTT triggers")
     try:
-        raw = _osascript('tell application "BetterTouchTool" to get_triggers')
-        triggers = json.loads(raw)
-        logger.debug(f"Found {len(triggers)} triggers")
+        triggers = _cached_triggers()
+        logger.debug("Found %d triggers", len(triggers))
         return triggers
     except Exception as e:
         logger.error(f"Error listing triggers: {e}")
@@ -306,11 +377,12 @@ def list_triggers() -> list:
 @mcp.tool()
 def delete_trigger(uuid: str) -> str:
     """Delete a trigger by UUID."""
-    logger.debug(f"delete_trigger called with uuid={uuid}")
+    logger.debug("delete_trigger called with uuid=%s", uuid)
     
     logger.info(f"Deleting trigger {uuid}")
     try:
         _open(_build_btt_url("delete_trigger", {"uuid": uuid}))
+        _invalidate_triggers_cache()
         return f"Trigger {uuid} deleted"
     except Exception as e:
         logger.error(f"Error deleting trigger: {e}")
@@ -327,11 +399,12 @@ def add_btt_trigger(trigger_json: str) -> str:
     Args:
         trigger_json: Full JSON definition of a BTT trigger (e.g. as copied via BTT → 'Copy JSON').
     """
-    logger.debug(f"add_btt_trigger called with raw JSON")
+    logger.debug("add_btt_trigger called with raw JSON")
         
     logger.info(f"Adding new BTT trigger with raw JSON: {trigger_json[:50]}...")
     try:
         _open(_build_btt_url("add_new_trigger", {"json": trigger_json}))
+        _invalidate_triggers_cache()
         return "Trigger added successfully."
     except Exception as e:
         logger.error(f"Error adding trigger with raw JSON: {e}")
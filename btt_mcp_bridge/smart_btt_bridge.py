@@ -23,7 +23,7 @@ from __future__ import annotations
 import json
 import os
 import subprocess
-import uuid
+import secrets
 import urllib.parse
 import sys
 import logging
@@ -33,7 +33,6 @@ from typing import List, Dict, Any, Union
 
 # Use the same import pattern as the working server.py
 from fastmcp import FastMCP, Context
-from pydantic import Field
 
 # Set up logging to stderr for Claude Desktop to capture
 logging.basicConfig(
@@ -241,7 +240,7 @@ def add_hotkey(
     trigger_json = {
         "BTTTriggerBelongsToPreset": "Default",
         "BTTActionCategory": 0,
-        "BTTUUID": str(uuid.uuid4()).upper(),
+        "BTTUUID": secrets.token_hex(16).upper(),
         "BTTTriggerType": 0,
         "BTTTriggerClass": "BTTTriggerTypeKeyboardShortcut",
         "BTTKeyboardShortcutKeyboardType": 0,
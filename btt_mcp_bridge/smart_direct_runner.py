@@ -19,17 +19,17 @@ logging.basicConfig(
 logger = logging.getLogger("smart_btt_mcp_bridge")
 
 # Log system information
-logger.debug(f"Python version: {sys.version}")
-logger.debug(f"Python executable: {sys.executable}")
-logger.debug(f"Sys path: {sys.path}")
+logger.debug("Python version: %s", sys.version)
+logger.debug("Python executable: %s", sys.executable)
+logger.debug("Sys path: %s", sys.path)
 
 # Get the directory of this script
 current_dir = os.path.dirname(os.path.abspath(__file__))
-logger.debug(f"Current directory: {current_dir}")
+logger.debug("Current directory: %s", current_dir)
 
 # Path to the smart_btt_bridge.py file
 bridge_path = os.path.join(current_dir, "smart_btt_bridge.py")
-logger.debug(f"Bridge path: {bridge_path}")
+logger.debug("Bridge path: %s", bridge_path)
 
 if not os.path.exists(bridge_path):
     logger.error(f"Bridge file not found at {bridge_path}")
@@ -50,7 +50,7 @@ try:
     logger.info(f"Successfully imported smart bridge module with MCP: {mcp.name}")
     
     # Log available tools to help with debugging
-    if hasattr(mcp, 'tools'):
+    if logger.isEnabledFor(logging.DEBUG) and hasattr(mcp, 'tools'):
         tools = mcp.tools
         logger.debug(f"Available tools: {[t.name for t in tools]}")
 except Exception as e:
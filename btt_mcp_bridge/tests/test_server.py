@@ -1,11 +1,21 @@
+import asyncio
+import importlib
 import json
+import socket
+import threading
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 from pathlib import Path
 from types import SimpleNamespace
 
 import pytest
 
 # The functions we want to test
+import _core
+import basic_smart_bridge
 import server
+import simplified_smart_bridge
 
 
 class DummyCompletedProcess(SimpleNamespace):
@@ -18,9 +28,14 @@ class DummyCompletedProcess(SimpleNamespace):
 
 def test_build_btt_url_with_secret(monkeypatch):
     monkeypatch.setenv("BTT_SHARED_SECRET", "xyz")
-    url = server._build_btt_url("trigger_named", {"trigger_name": "Test"})
-    assert "shared_secret=xyz" in url
-    assert url.startswith("btt://trigger_named/?")
+    importlib.reload(_core)  # the secret is encoded once at import time
+    try:
+        url = server._build_btt_url("trigger_named", {"trigger_name": "Test"})
+        assert "shared_secret=xyz" in url
+        assert url.startswith("btt://trigger_named/?")
+    finally:
+        monkeypatch.delenv("BTT_SHARED_SECRET")
+        importlib.reload(_core)
 
 
 def test_add_btt_trigger_invokes_open(monkeypatch):
@@ -29,10 +44,10 @@ def test_add_btt_trigger_invokes_open(monkeypatch):
     def fake_run(cmd, check):
         calls.append(cmd)
 
-    monkeypatch.setattr(server, "subprocess", SimpleNamespace(run=fake_run))
-    server.add_btt_trigger(
-        server.AddTriggerArgs(trigger_json='{"BTTDummy":"yes"}')
-    )
+    monkeypatch.setattr(_core, "_http_enabled", False)
+    monkeypatch.setattr(_core, "_LS", None)
+    monkeypatch.setattr(_core.subprocess, "run", fake_run)
+    server.add_btt_trigger(trigger_json='{"BTTDummy":"yes"}')
     assert calls, "open() was never called"
     assert calls[0][0] == "open"
     assert calls[0][1].startswith("btt://add_new_trigger/")
@@ -43,9 +58,301 @@ def test_list_btt_triggers_parses_json(monkeypatch):
         [{"BTTUUID": "123", "BTTAppBundleIdentifier": "com.apple.finder"}]
     )
 
-    def fake_check_output(cmd, text):
-        return sample_json
-
-    monkeypatch.setattr(server, "subprocess", SimpleNamespace(check_output=fake_check_output))
+    monkeypatch.setattr(_core, "_http_enabled", False)
+    monkeypatch.setattr(_core, "SBApplication", None)
+    monkeypatch.setattr(_core, "_triggers_cache", None)
+    monkeypatch.setattr(_core, "_osascript", lambda source: sample_json)
     triggers = server.list_btt_triggers()
     assert triggers[0]["BTTUUID"] == "123"
+
+
+def test_list_btt_triggers_is_cached_until_modified(monkeypatch):
+    calls = []
+
+    def fake_get_triggers_json():
+        calls.append(1)
+        return '[{"BTTUUID": "123"}]'
+
+    monkeypatch.setattr(_core, "_triggers_cache", None)
+    monkeypatch.setattr(_core, "_get_triggers_json", fake_get_triggers_json)
+    monkeypatch.setattr(server, "_open", lambda url: None)
+
+    server.list_btt_triggers()
+    server.list_btt_triggers()
+    assert len(calls) == 1
+
+    server.delete_btt_trigger(uuid="123")
+    server.list_btt_triggers()
+    assert len(calls) == 2
+
+
+def test_open_many_forks_open_once(monkeypatch):
+    calls = []
+
+    def fake_run(cmd, check):
+        calls.append(cmd)
+
+    monkeypatch.setattr(_core, "_http_enabled", False)
+    monkeypatch.setattr(_core, "_LS", None)
+    monkeypatch.setattr(_core.subprocess, "run", fake_run)
+    urls = [_core._build_btt_url("delete_trigger", {"uuid": str(i)}) for i in range(3)]
+    _core._open_many(urls)
+    assert calls == [["open", *urls]]
+
+
+def test_open_prefers_btt_webserver(monkeypatch):
+    paths = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            paths.append(self.path)
+            body = b'[{"BTTUUID": "123"}]'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(_core, "BTT_HTTP_PORT", httpd.server_port)
+        monkeypatch.setattr(_core, "_HTTP_POOL", [])
+        monkeypatch.setattr(_core, "_http_enabled", True)
+        monkeypatch.setattr(_core.subprocess, "run", lambda *a, **k: pytest.fail("spawned open"))
+
+        _core._open(_core._build_btt_url("delete_trigger", {"uuid": "123"}))
+        assert _core._get_triggers_json() == '[{"BTTUUID": "123"}]'
+        assert paths == ["/delete_trigger/?uuid=123", "/get_triggers/"]
+    finally:
+        _core._close_http_pool()
+        httpd.shutdown()
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(handler):
+    httpd = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def _use_webserver(monkeypatch, port):
+    monkeypatch.setattr(_core, "BTT_HTTP_PORT", port)
+    monkeypatch.setattr(_core, "_HTTP_POOL", [])
+    monkeypatch.setattr(_core, "_http_enabled", True)
+    monkeypatch.setattr(_core, "_http_retry_at", 0.0)
+    monkeypatch.setattr(_core, "_ls_open", lambda url: pytest.fail("dispatched again via LaunchServices"))
+    monkeypatch.setattr(_core.subprocess, "run", lambda *a, **k: pytest.fail("dispatched again via open"))
+
+
+def test_open_does_not_resend_after_a_timeout(monkeypatch):
+    paths = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            paths.append(self.path)
+            time.sleep(0.5)  # BTT got the call but answers too late
+
+        def log_message(self, *args):
+            pass
+
+    httpd = _serve(Handler)
+    try:
+        _use_webserver(monkeypatch, httpd.server_port)
+        monkeypatch.setattr(_core, "_HTTP_TIMEOUT", 0.1)
+
+        with pytest.raises(OSError):
+            _core._open(_core._build_btt_url("add_new_trigger", {"json": "{}"}))
+        assert len(paths) == 1
+    finally:
+        httpd.shutdown()
+
+
+def test_stale_keepalive_is_resent_once(monkeypatch):
+    paths = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # advertise keep-alive...
+
+        def do_GET(self):
+            paths.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+            self.close_connection = True  # ...then drop the connection anyway
+
+        def log_message(self, *args):
+            pass
+
+    httpd = _serve(Handler)
+    try:
+        _use_webserver(monkeypatch, httpd.server_port)
+        assert _core._btt_http_get("/first/") == "ok"
+        time.sleep(0.1)  # let the server close its end
+        assert _core._btt_http_get("/second/") == "ok"
+        assert paths == ["/first/", "/second/"]
+    finally:
+        _core._close_http_pool()
+        httpd.shutdown()
+
+
+def test_refused_webserver_is_retried_after_backoff(monkeypatch):
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()  # nothing listens on this port now
+
+    _use_webserver(monkeypatch, port)
+    assert _core._btt_http_get("/get_triggers/") is None
+    assert _core._http_retry_at > time.monotonic()
+
+    # Within the backoff the port isn't tried at all
+    connection = _core.http.client.HTTPConnection
+    monkeypatch.setattr(_core.http.client, "HTTPConnection",
+                        lambda *a, **k: pytest.fail("reconnected during backoff"))
+    assert _core._btt_http_get("/get_triggers/") is None
+
+    # Once it has passed, the webserver is tried again
+    httpd = _serve(_OkHandler)
+    try:
+        monkeypatch.setattr(_core.http.client, "HTTPConnection", connection)
+        monkeypatch.setattr(_core, "BTT_HTTP_PORT", httpd.server_port)
+        monkeypatch.setattr(_core, "_http_retry_at", 0.0)
+        assert _core._btt_http_get("/get_triggers/") == "ok"
+    finally:
+        _core._close_http_pool()
+        httpd.shutdown()
+
+
+def test_add_hotkeys_bulk_sends_concurrently_over_the_webserver(monkeypatch):
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with lock:
+                in_flight.append(self.path)
+                peak.append(len(in_flight))
+            time.sleep(0.2)
+            with lock:
+                in_flight.remove(self.path)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        _use_webserver(monkeypatch, httpd.server_port)
+        specs = [{"trigger": "cmd+a", "send_keys": "cmd+c"} for _ in range(4)]
+        added = asyncio.run(basic_smart_bridge.add_hotkeys_bulk(specs, max_concurrent=4))
+        assert len(added) == 4
+        assert max(peak) > 1
+    finally:
+        _core._close_http_pool()
+        httpd.shutdown()
+
+
+def test_add_hotkeys_bulk_names_a_spec_without_trigger():
+    with pytest.raises(ValueError, match="spec 1"):
+        asyncio.run(basic_smart_bridge.add_hotkeys_bulk(
+            [{"trigger": "cmd+a", "send_keys": "cmd+c"}, {"send_keys": "cmd+v"}]))
+
+
+def _bulk_add_hotkeys(triggers_json):
+    tool = simplified_smart_bridge.bulk_add_hotkeys
+    return getattr(tool, "fn", tool)(triggers_json)
+
+
+def test_bulk_add_hotkeys_opens_all_urls_at_once(monkeypatch):
+    batches = []
+    monkeypatch.setattr(simplified_smart_bridge, "_open_many", batches.append)
+    monkeypatch.setattr(_core, "_triggers_cache", ([], time.monotonic()))
+
+    specs = [{"trigger": "cmd+a", "send_keys": "cmd+c"} for _ in range(3)]
+    added = _bulk_add_hotkeys(json.dumps(specs))
+    assert len(added) == 3
+    assert len(batches) == 1
+    assert len(batches[0]) == 3
+    assert all(url.startswith("btt://add_new_trigger/") for url in batches[0])
+    assert _core._triggers_cache is None
+
+
+@pytest.mark.parametrize("specs, message", [
+    ([{"trigger": "cmd+a", "send_keys": "cmd+c"}, {"send_keys": "cmd+v"}], "spec 1 has no 'trigger'"),
+    (["cmd+k"], "spec 0 is not an object"),
+])
+def test_bulk_add_hotkeys_rejects_bad_specs(monkeypatch, specs, message):
+    batches = []
+    monkeypatch.setattr(simplified_smart_bridge, "_open_many", batches.append)
+    with pytest.raises(ValueError, match=message):
+        _bulk_add_hotkeys(json.dumps(specs))
+    assert batches == []  # nothing is sent when any spec is bad
+
+
+# Stands in for `osascript -i`: prompts with ">> " and prints each result in
+# AppleScript source form, looked up from the transcript passed as argv[1]
+FAKE_OSASCRIPT = r'''
+import json, sys
+transcript = json.loads(sys.argv[1])
+sys.stdout.write(">> ")
+sys.stdout.flush()
+for line in sys.stdin:
+    source = line.rstrip("\n")
+    result = source if source.startswith('"') else transcript[source]
+    sys.stdout.write(f"=> {result}\n>> ")
+    sys.stdout.flush()
+'''
+
+
+@pytest.fixture
+def fake_osascript(monkeypatch, tmp_path):
+    script = tmp_path / "osascript.py"
+    script.write_text(FAKE_OSASCRIPT)
+    popen = _core.subprocess.Popen
+
+    def start(transcript):
+        monkeypatch.setattr(_core, "_AS_PROC", None)
+        monkeypatch.setattr(_core.subprocess, "Popen", lambda cmd, **kwargs: popen(
+            [sys.executable, str(script), json.dumps(transcript)], **kwargs))
+
+    yield start
+    _core._close_osascript()
+
+
+def test_osascript_interactive_decodes_string_results(monkeypatch, fake_osascript):
+    source = 'tell application "BetterTouchTool" to get_triggers'
+    fake_osascript({source: r'"[{\"BTTUUID\":\"123\",\"BTTTriggerName\":\"say \\\"hi\\\"\\\\n\"}]"'})
+    monkeypatch.setattr(_core.subprocess, "check_output", lambda *a, **k: pytest.fail("ran osascript -e"))
+
+    output = _core._osascript(source)
+    assert json.loads(output) == [{"BTTUUID": "123", "BTTTriggerName": 'say "hi"\\n'}]
+    assert _core._osascript(source) == output  # the co-process is reused
+
+
+def test_osascript_interactive_leaves_lists_to_one_shot(monkeypatch, fake_osascript):
+    fake_osascript({"get {1, 2}": "{1, 2}", "get 42": "42"})
+    monkeypatch.setattr(_core.subprocess, "check_output", lambda cmd, text: "1, 2\n")
+
+    assert _core._osascript("get {1, 2}") == "1, 2\n"
+    assert _core._osascript("get 42") == "42\n"
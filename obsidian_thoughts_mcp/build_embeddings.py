@@ -4,9 +4,12 @@ Thoughts Embeddings Builder for Auto-Tagger Obsidian Plugin
 
 This script recursively walks through all Markdown files in the '1 - Thoughts' directory,
 generates embeddings for both the title and content of each file, and saves them
-to CSV files for later use in similarity searches.
+to CSV files for later use in similarity searches. Each CSV also gets an
+L2-normalized float32 .npy matrix, a .paths.txt row index and a .meta.json
+next to it, which load without any JSON parsing.
 
-Uses batch processing with ThreadPoolExecutor for parallel embedding generation.
+Files are read in parallel with a small ThreadPoolExecutor and their titles and
+contents are embedded in batches through Ollama's /api/embed endpoint.
 """
 
 import os
@@ -14,11 +17,23 @@ import json
 import csv
 import sys
 import time
+import collections
 import concurrent.futures
+import hashlib
+import itertools
+import threading
 from typing import Dict, List, Tuple, Optional, Any
 from pathlib import Path
+import numpy as np
 import requests
 import tqdm
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional, faster encoding/decoding of the embedding vectors
+    orjson = None
 
 # Default settings - override these with environment variables if needed
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
@@ -26,13 +41,40 @@ EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "mxbai-embed-large:latest")
 
 # Concurrency and batching settings
 BATCH_SIZE = 100  # Process files in batches of this size
-MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "100"))  # Maximum number of concurrent workers
-BATCH_DELAY_MS = 200  # Delay between batches in milliseconds
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "8"))  # Maximum number of concurrent file readers
+READ_AHEAD = 2 * BATCH_SIZE  # Files read ahead of the one being embedded
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))  # Texts per /api/embed request
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))  # /api/embed requests kept in flight
+BATCH_DELAY_MS = int(os.environ.get("BATCH_DELAY_MS", "0"))  # Optional pause between batches in milliseconds
+
+# (connect, read) timeouts in seconds for Ollama requests
+REQUEST_TIMEOUT = (3, 120)
+
+# Shared HTTP session so requests to Ollama reuse keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(
+    pool_connections=MAX_WORKERS,
+    pool_maxsize=max(MAX_WORKERS, EMBED_CONCURRENCY),
+    max_retries=Retry(total=2, backoff_factor=0.1),
+))
 
 # Output files
 TITLE_EMBEDDINGS_FILE = "thoughts_embedding/title_embeddings.csv"
 BODY_EMBEDDINGS_FILE = "thoughts_embedding/thought_embeddings.csv"
 
+# Incremental-build cache (file path -> mtime and content hash); when empty it
+# is kept next to BODY_EMBEDDINGS_FILE as .embed_cache.json
+EMBED_CACHE_FILE = ""
+
+# Display titles for the MCP search tools (file path -> heading text, or null
+# to use the file name); when empty it is kept next to TITLE_EMBEDDINGS_FILE
+# as titles.json
+TITLES_FILE = ""
+
+# Note count for the MCP stats resource, with the directories it was counted in
+# and when; when empty it is kept next to BODY_EMBEDDINGS_FILE as index.json
+INDEX_FILE = ""
+
 # Thoughts directory to process - path to the vault's '1 - Thoughts' folder
 THOUGHTS_DIR = "/Users/aidanlowrie/Library/Mobile Documents/iCloud~md~obsidian/Documents/My Brain/1 - Thoughts"
 
@@ -41,11 +83,7 @@ def get_title_from_markdown(filepath: Path) -> str:
     """Extract the title from a markdown file (first line, without # prefix)"""
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            first_line = f.readline().strip()
-            # Remove markdown heading markers
-            if first_line.startswith("#"):
-                return first_line.lstrip("#").strip()
-            return first_line
+            return title_from_first_line(f.readline())
     except Exception as e:
         print(f"Error reading title from {filepath}: {e}")
         return os.path.basename(filepath)
@@ -61,90 +99,384 @@ def get_content_from_markdown(filepath: Path) -> str:
         return ""
 
 
+def title_from_first_line(first_line: str) -> str:
+    """Turn a markdown file's first line into a title (without # prefix)"""
+    first_line = first_line.strip()
+    # Remove markdown heading markers
+    if first_line.startswith("#"):
+        return first_line.lstrip("#").strip()
+    return first_line
+
+
+def heading_title(content: str) -> Optional[str]:
+    """Return the text of a note's first line if it is a '#' heading, else None"""
+    newline = content.find("\n")
+    first_line = content if newline == -1 else content[:newline]
+    if first_line.startswith("#"):
+        return first_line.lstrip("#").strip()
+    return None
+
+
+def read_title_and_content(filepath: Path) -> Tuple[str, str]:
+    """Read a markdown file once and return its (title, content)"""
+    try:
+        content = Path(filepath).read_text(encoding='utf-8')
+    except Exception as e:
+        print(f"Error reading {filepath}: {e}")
+        return os.path.basename(filepath), ""
+    newline = content.find("\n")
+    return title_from_first_line(content if newline == -1 else content[:newline]), content
+
+
+def iter_markdown_files(directory: str, visited: Optional[List[str]] = None):
+    """Yield every .md file under directory, walking it with os.scandir
+
+    If `visited` is given, every directory scanned is appended to it.
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        if visited is not None:
+            visited.append(current)
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.is_symlink():
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".md") and entry.is_file():
+                        yield Path(entry.path)
+        except OSError as e:
+            print(f"Error scanning {current}: {e}")
+
+
+# Embeddings already generated during this run, keyed by (model, text digest),
+# so repeated titles ("Untitled", dates) and template bodies are sent only once
+_emb_cache: Dict[Tuple[str, bytes], List[float]] = {}
+_emb_cache_lock = threading.Lock()
+
+
+def _text_key(text: str, model: str) -> Tuple[str, bytes]:
+    return model, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
 def embed_text(text: str, model: str = EMBEDDING_MODEL) -> Optional[List[float]]:
-    """Generate embeddings for text using Ollama API"""
-    if not text.strip():
-        return None
+    """Generate embeddings for text using Ollama API (one-text embed_texts)"""
+    return embed_texts([text], model)[0]
+
+
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL,
+                batch_size: int = EMBED_BATCH_SIZE) -> List[Optional[List[float]]]:
+    """Generate embeddings for several texts through Ollama's /api/embed endpoint.
+
+    Texts are sent `batch_size` per request, with up to EMBED_CONCURRENCY
+    requests in flight at once. Texts already embedded during this
+    run (and duplicates within `texts`) are served from memory. Returns one
+    entry per input text, None for blank texts or if their request fails.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
     
-    url = f"{OLLAMA_BASE_URL}/api/embeddings"
+    # Positions of each distinct text that still needs an embedding
+    pending: Dict[Tuple[str, bytes], List[int]] = {}
+    with _emb_cache_lock:
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue
+            key = _text_key(text, model)
+            cached = _emb_cache.get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(key, []).append(i)
+    if not pending:
+        return results
+
+    url = f"{OLLAMA_BASE_URL}/api/embed"
     
-    payload = {
-        "model": model,
-        "prompt": text
-    }
+    def send(batch: List[Tuple[Tuple[str, bytes], List[int]]]) -> None:
+        payload = {
+            "model": model,
+            "input": [texts[positions[0]] for _, positions in batch]
+        }
+
+        try:
+            response = _SESSION.post(url, json=payload, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            data = response.json()
+
+            embeddings = data.get("embeddings")
+            if not embeddings or len(embeddings) != len(batch):
+                print(f"Error: Unexpected embeddings in response: {str(data)[:200]}")
+                return
+
+            with _emb_cache_lock:
+                for (key, positions), embedding in zip(batch, embeddings):
+                    _emb_cache[key] = embedding
+                    for i in positions:
+                        results[i] = embedding
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
     
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        
-        if "embedding" not in data:
-            print(f"Error: No embedding in response: {data}")
-            return None
-            
-        return data["embedding"]
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
+    items = list(pending.items())
+    step = max(1, batch_size)
+    batches = [items[start:start + step] for start in range(0, len(items), step)]
+    if len(batches) == 1 or EMBED_CONCURRENCY <= 1:
+        for batch in batches:
+            send(batch)
+    else:
+        # Keep up to EMBED_CONCURRENCY requests in flight; each batch writes
+        # only its own positions, so completion order doesn't matter
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(EMBED_CONCURRENCY, len(batches))) as executor:
+            list(executor.map(send, batches))
+    return results
+
+
+def embedding_to_json(embedding: List[float]) -> str:
+    """Serialize an embedding vector as a JSON list"""
+    if orjson is not None:
+        return orjson.dumps(embedding).decode()
+    return json.dumps(embedding)
+
+
+def open_embeddings_csv(output_file: str):
+    """Create an embeddings CSV file with its header row and return (file, writer)"""
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    f = open(output_file, 'w', newline='', encoding='utf-8')
+    writer = csv.writer(f)
+    writer.writerow(['file_path', 'embedding'])
+    return f, writer
 
 
 def write_embeddings_to_csv(embeddings: Dict[str, List[float]], output_file: str):
     """Write embeddings to a CSV file"""
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['file_path', 'embedding'])
-        
+    f, writer = open_embeddings_csv(output_file)
+    with f:
         for file_path, embedding in embeddings.items():
-            # Convert embedding to JSON string
-            embedding_json = json.dumps(embedding)
-            writer.writerow([file_path, embedding_json])
+            writer.writerow([file_path, embedding_to_json(embedding)])
+    write_embeddings_npy(list(embeddings), list(embeddings.values()), output_file)
+
+
+def npy_sidecar_paths(csv_file: str) -> Tuple[str, str, str]:
+    """Return the .npy matrix, .paths.txt row index and .meta.json that accompany an embeddings CSV"""
+    base = os.path.splitext(csv_file)[0]
+    return base + ".npy", base + ".paths.txt", base + ".meta.json"
+
+
+def write_embeddings_npy(paths: List[str], matrix, output_file: str):
+    """Save embeddings as a float32 .npy matrix plus a .paths.txt row index next to output_file
+
+    Rows are L2-normalized on the way out, so cosine similarity against the
+    matrix is a single dot product; the .meta.json sidecar records this.
+    """
+    npy_file, paths_file, meta_file = npy_sidecar_paths(output_file)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim != 2:  # e.g. no embeddings at all
+        matrix = matrix.reshape(len(paths), -1 if paths else 0)
+    with open(npy_file + ".tmp", 'wb') as f:
+        np.lib.format.write_array_header_1_0(f, {
+            'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+            'fortran_order': False,
+            'shape': matrix.shape,
+        })
+        # Normalize in blocks so a memory-mapped input is never fully loaded
+        for start in range(0, len(matrix), 4096):
+            block = np.array(matrix[start:start + 4096], dtype=np.float32)
+            block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            f.write(block.tobytes())
+    with open(paths_file + ".tmp", 'w', encoding='utf-8') as f:
+        f.write('\n'.join(paths))
+    with open(meta_file + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({
+            "normalized": True,
+            "dtype": "float32",
+            "dim": matrix.shape[1],
+            "rows": matrix.shape[0],
+            "model": EMBEDDING_MODEL,
+        }, f)
+    os.replace(npy_file + ".tmp", npy_file)
+    os.replace(paths_file + ".tmp", paths_file)
+    os.replace(meta_file + ".tmp", meta_file)
+
+
+def load_embeddings_npy(csv_file: str) -> Tuple[Optional[np.ndarray], Dict[str, int]]:
+    """Memory-map an embeddings CSV's .npy sidecar and map each path to its row"""
+    npy_file, paths_file, _ = npy_sidecar_paths(csv_file)
+    try:
+        matrix = np.load(npy_file, mmap_mode='r')
+        with open(paths_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, ValueError):
+        return None, {}
+    paths = text.split('\n') if text else []
+    if matrix.ndim != 2 or len(paths) != len(matrix):
+        return None, {}
+    return matrix, {path: i for i, path in enumerate(paths)}
+
+
+def read_file(filepath: Path) -> Tuple[str, str, str]:
+    """Read a file's path identifier, title and content"""
+    # Store the absolute path as the identifier
+    return (str(filepath), *read_title_and_content(filepath))
+
+
+def content_hash(content: str) -> str:
+    """Hash note content for change detection (not for security)"""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _read_with_mtime(filepath: Path) -> Tuple[str, str, str, Optional[int]]:
+    """read_file() plus the file's mtime, taken before the read"""
+    try:
+        mtime_ns = os.stat(filepath).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    return (*read_file(filepath), mtime_ns)
+
+
+def unchanged_fingerprint(filepath: Path, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Return the file's fingerprint if it still matches its cache entry, else None
+
+    The mtime is checked first; the content is only read and hashed when the
+    mtime moved, so touched-but-unchanged files are still recognised (as are
+    entries from caches written before headings were recorded).
+    """
+    if not entry:
+        return None
+    try:
+        mtime_ns = os.stat(filepath).st_mtime_ns
+    except OSError:
+        return None
+    if mtime_ns == entry.get("mtime_ns") and "heading" in entry:
+        return entry
+    _, content = read_title_and_content(filepath)
+    if content and content_hash(content) == entry.get("hash"):
+        return {"mtime_ns": mtime_ns, "hash": entry["hash"], "heading": heading_title(content)}
+    return None
+
+
+def load_embed_cache(cache_file: str) -> Dict[str, Dict[str, Any]]:
+    """Load the incremental-build cache, ignoring it if it was built with another model"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("model") != EMBEDDING_MODEL:
+        return {}
+    return data.get("files", {})
+
+
+def save_embed_cache(cache_file: str, files: Dict[str, Dict[str, Any]]):
+    """Atomically write the incremental-build cache"""
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({"model": EMBEDDING_MODEL, "files": files}, f)
+    os.replace(tmp_file, cache_file)
+
+
+def save_titles(titles_file: str, titles: Dict[str, Optional[str]]):
+    """Atomically write the path -> display title table"""
+    tmp_file = titles_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(titles, f, ensure_ascii=False)
+    os.replace(tmp_file, titles_file)
+
+
+def save_index(index_file: str, total_thoughts: int, directories: List[str], listed_at: float):
+    """Atomically write the note count and the directories it was taken from"""
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "thoughts_directory": THOUGHTS_DIR,
+            "total_thoughts": total_thoughts,
+            "updated_at": listed_at,
+            "directories": directories,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_file, index_file)
+
+
+def index_embeddings_csv(csv_path: str) -> Dict[str, Tuple[int, int]]:
+    """Map each file path in an embeddings CSV to the byte (offset, length) of its row"""
+    index = {}
+    if not os.path.exists(csv_path):
+        return index
+    with open(csv_path, 'rb') as f:
+        offset = len(f.readline())  # header
+        for line in f:
+            if line.startswith(b'"'):
+                # Quoted path (contains a comma or quote); let csv unescape it
+                row = next(csv.reader([line.decode('utf-8')]), [])
+                file_path = row[0] if row else None
+            else:
+                file_path = line.split(b',', 1)[0].decode('utf-8')
+            if file_path:
+                index[file_path] = (offset, len(line))
+            offset += len(line)
+    return index
 
 
 def process_file(filepath: Path) -> Tuple[str, Optional[List[float]], Optional[List[float]]]:
     """Process a single file to extract title and content embeddings"""
-    # Store the absolute path as the identifier
-    file_path_str = str(filepath)
-    title = get_title_from_markdown(filepath)
-    content = get_content_from_markdown(filepath)
-    
-    # Skip empty files
-    if not content.strip():
-        print(f"Skipping empty file: {file_path_str}")
-        return file_path_str, None, None
-    
-    # Generate title embedding
-    title_embedding = embed_text(title)
-    
-    # Generate content embedding
-    content_embedding = embed_text(content)
-    
-    return file_path_str, title_embedding, content_embedding
+    result = process_batch([filepath]).get(str(filepath), {})
+    return str(filepath), result.get("title"), result.get("content")
+
+
+def iter_read_ahead(func, items, executor: concurrent.futures.Executor, depth: int = READ_AHEAD):
+    """Yield func(item) for each item in order, keeping up to `depth` calls running ahead
+
+    Lets the file readers keep working in the background while the caller is
+    blocked on Ollama, without buffering the whole vault in memory.
+    """
+    items = iter(items)
+    pending = collections.deque(
+        executor.submit(func, item) for item in itertools.islice(items, depth)
+    )
+    while pending:
+        result = pending.popleft().result()
+        for item in itertools.islice(items, 1):
+            pending.append(executor.submit(func, item))
+        yield result
 
 
 def process_batch(files: List[Path]) -> Dict[str, Dict[str, Any]]:
-    """Process a batch of files concurrently using ThreadPoolExecutor"""
+    """Read a batch of files in parallel, then embed their titles and contents in batches"""
+    # Reading is I/O-bound, so a small thread pool is enough
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        documents = list(executor.map(_read_with_mtime, files))
+    return embed_documents(documents)
+
+
+def embed_documents(documents: List[Tuple[str, str, str, Optional[int]]]) -> Dict[str, Dict[str, Any]]:
+    """Embed the titles and contents of already-read files (see _read_with_mtime)"""
     results = {}
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Submit all tasks to the executor
-        future_to_file = {
-            executor.submit(process_file, filepath): filepath 
-            for filepath in files
+    file_paths = []
+    titles = []
+    contents = []
+    fingerprints = []
+    for file_path, title, content, mtime_ns in documents:
+        # Skip empty files
+        if not content.strip():
+            print(f"Skipping empty file: {file_path}")
+            results[file_path] = {"title": None, "content": None, "fingerprint": None}
+            continue
+        file_paths.append(file_path)
+        titles.append(title)
+        contents.append(content)
+        fingerprints.append({"mtime_ns": mtime_ns, "hash": content_hash(content),
+                             "heading": heading_title(content)})
+    
+    # Embed titles and contents together, EMBED_BATCH_SIZE texts per request
+    embeddings = embed_texts(titles + contents)
+    
+    # Scatter the results back to their files
+    count = len(file_paths)
+    for j, file_path in enumerate(file_paths):
+        results[file_path] = {
+            "title": embeddings[j],
+            "content": embeddings[count + j],
+            "fingerprint": fingerprints[j]
         }
-        
-        # Process completed tasks as they finish
-        for future in concurrent.futures.as_completed(future_to_file):
-            filepath = future_to_file[future]
-            try:
-                file_path, title_embedding, content_embedding = future.result()
-                results[file_path] = {
-                    "title": title_embedding,
-                    "content": content_embedding
-                }
-            except Exception as e:
-                print(f"Error processing file {filepath}: {e}")
     
     return results
 
@@ -154,11 +486,15 @@ def main():
     start_time = time.time()
     print(f"Starting thoughts embedding process using model: {EMBEDDING_MODEL}")
     print(f"Looking for Markdown files in: {THOUGHTS_DIR}")
-    print(f"Using up to {MAX_WORKERS} concurrent workers")
+    print(f"Using up to {MAX_WORKERS} file readers and {EMBED_BATCH_SIZE} texts per embedding request "
+          f"({EMBED_CONCURRENCY} in flight)")
+    
+    # Start every run with an empty in-memory embedding cache
+    _emb_cache.clear()
     
     # Check if Ollama API is accessible
     try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags")
+        response = _SESSION.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         print("Successfully connected to Ollama API")
     except Exception as e:
@@ -167,7 +503,10 @@ def main():
         sys.exit(1)
     
     # Get all markdown files in the thoughts directory (including subdirectories)
-    markdown_files = list(Path(THOUGHTS_DIR).glob("**/*.md"))
+    # Taken before the walk, so a directory changed during it counts as newer
+    listed_at = time.time()
+    directories: List[str] = []
+    markdown_files = list(iter_markdown_files(THOUGHTS_DIR, directories))
     
     if not markdown_files:
         print(f"No Markdown files found in {THOUGHTS_DIR}")
@@ -176,49 +515,180 @@ def main():
     total_files = len(markdown_files)
     print(f"Found {total_files} Markdown files")
     
-    # Containers for embeddings
-    title_embeddings = {}
-    body_embeddings = {}
-    
-    # Process files in batches
-    for i in range(0, len(markdown_files), BATCH_SIZE):
-        batch = markdown_files[i:i + BATCH_SIZE]
-        batch_num = i // BATCH_SIZE + 1
-        total_batches = (total_files + BATCH_SIZE - 1) // BATCH_SIZE
-        
-        print(f"Processing batch {batch_num}/{total_batches} with {len(batch)} files")
-        
-        # Process the batch with concurrent execution
-        batch_results = process_batch(batch)
-        
-        # Extract and store results
-        for file_path, embeddings in batch_results.items():
-            title_emb = embeddings["title"]
-            content_emb = embeddings["content"]
+    # Unchanged files (same mtime, or same content hash) reuse their rows from
+    # the previous CSVs instead of being embedded again
+    cache_file = EMBED_CACHE_FILE or os.path.join(
+        os.path.dirname(BODY_EMBEDDINGS_FILE) or ".", ".embed_cache.json")
+    old_cache = load_embed_cache(cache_file)
+    old_title_rows = index_embeddings_csv(TITLE_EMBEDDINGS_FILE) if old_cache else {}
+    old_body_rows = index_embeddings_csv(BODY_EMBEDDINGS_FILE) if old_cache else {}
+    new_cache: Dict[str, Dict[str, Any]] = {}
+    # Titles come from the content too, so a renamed or moved note (or a copy)
+    # can take over the rows of any old note with the same content hash
+    old_paths_by_hash = {
+        entry.get("hash"): file_path for file_path, entry in old_cache.items()
+        if file_path in old_title_rows and file_path in old_body_rows
+    }
+    
+    # Rows are streamed to temporary CSV files as each batch finishes, so
+    # nothing is held in memory across batches; the previous CSVs stay intact
+    # (and readable for reuse) until the new ones replace them at the end
+    title_file, title_writer = open_embeddings_csv(TITLE_EMBEDDINGS_FILE + ".tmp")
+    body_file, body_writer = open_embeddings_csv(BODY_EMBEDDINGS_FILE + ".tmp")
+    old_title_file = open(TITLE_EMBEDDINGS_FILE, 'rb') if old_title_rows else None
+    old_body_file = open(BODY_EMBEDDINGS_FILE, 'rb') if old_body_rows else None
+    # Float32 rows for the .npy sidecars are appended to raw files as they are
+    # written and normalized into .npy files at the end; reused rows come from
+    # the previous .npy files (or, failing that, from the CSV line itself)
+    old_title_matrix, old_title_index = load_embeddings_npy(TITLE_EMBEDDINGS_FILE)
+    old_body_matrix, old_body_index = load_embeddings_npy(BODY_EMBEDDINGS_FILE)
+    title_raw = open(npy_sidecar_paths(TITLE_EMBEDDINGS_FILE)[0] + ".f32.tmp", 'wb')
+    body_raw = open(npy_sidecar_paths(BODY_EMBEDDINGS_FILE)[0] + ".f32.tmp", 'wb')
+    title_paths: List[str] = []
+    body_paths: List[str] = []
+    title_count = 0
+    body_count = 0
+    reused_count = 0
+    
+    def prepare(filepath: Path):
+        """Stage 1 (reader threads): reuse check, then read the file if it changed
+
+        Returns (file_path, fingerprint, document, source_path); a fingerprint
+        means the rows of source_path in the previous CSVs can be reused.
+        """
+        file_path = str(filepath)
+        if file_path in old_title_rows and file_path in old_body_rows:
+            fingerprint = unchanged_fingerprint(filepath, old_cache.get(file_path))
+            if fingerprint:
+                return file_path, fingerprint, None, file_path
+        document = _read_with_mtime(filepath)
+        if old_paths_by_hash and document[2].strip():
+            digest = content_hash(document[2])
+            source_path = old_paths_by_hash.get(digest)
+            if source_path:
+                fingerprint = {"mtime_ns": document[3], "hash": digest,
+                               "heading": heading_title(document[2])}
+                return file_path, fingerprint, None, source_path
+        return file_path, None, document, None
+    
+    # Stage 2 (this thread): embed and write batch by batch while the readers
+    # stay up to READ_AHEAD files ahead
+    reader = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    prepared = iter_read_ahead(prepare, markdown_files, reader)
+    
+    try:
+        # Process files in batches
+        for i in range(0, len(markdown_files), BATCH_SIZE):
+            batch = list(itertools.islice(prepared, BATCH_SIZE))
+            batch_num = i // BATCH_SIZE + 1
+            total_batches = (total_files + BATCH_SIZE - 1) // BATCH_SIZE
             
-            if title_emb:
-                title_embeddings[file_path] = title_emb
+            print(f"Processing batch {batch_num}/{total_batches} with {len(batch)} files")
             
-            if content_emb:
-                body_embeddings[file_path] = content_emb
-        
-        # Show progress after each batch
-        processed = min(i + BATCH_SIZE, total_files)
-        print(f"Progress: {processed}/{total_files} files ({processed/total_files*100:.1f}%)")
-        
-        # Apply batch delay if not the last batch
-        if i + BATCH_SIZE < len(markdown_files):
-            time.sleep(BATCH_DELAY_MS / 1000)
-    
-    # Write embeddings to CSV files
-    write_embeddings_to_csv(title_embeddings, TITLE_EMBEDDINGS_FILE)
-    write_embeddings_to_csv(body_embeddings, BODY_EMBEDDINGS_FILE)
+            # Copy rows for unchanged files straight from the previous CSVs
+            documents = []
+            for file_path, fingerprint, document, source_path in batch:
+                if fingerprint:
+                    for old_file, rows, new_file, writer, old_matrix, old_index, raw, paths in (
+                        (old_title_file, old_title_rows, title_file, title_writer,
+                         old_title_matrix, old_title_index, title_raw, title_paths),
+                        (old_body_file, old_body_rows, body_file, body_writer,
+                         old_body_matrix, old_body_index, body_raw, body_paths),
+                    ):
+                        offset, length = rows[source_path]
+                        old_file.seek(offset)
+                        line = old_file.read(length).decode('utf-8')
+                        if source_path == file_path:
+                            new_file.write(line)
+                        else:
+                            writer.writerow([file_path, next(csv.reader([line]))[1]])
+                        if source_path in old_index:
+                            vector = old_matrix[old_index[source_path]]
+                        else:
+                            field = next(csv.reader([line]))[1]
+                            vector = orjson.loads(field) if orjson is not None else json.loads(field)
+                        raw.write(np.asarray(vector, dtype=np.float32).tobytes())
+                        paths.append(file_path)
+                    new_cache[file_path] = fingerprint
+                    title_count += 1
+                    body_count += 1
+                    reused_count += 1
+                else:
+                    documents.append(document)
+            
+            # Embed the rest of the batch
+            batch_results = embed_documents(documents) if documents else {}
+            
+            # Write results straight to the CSV files
+            for file_path, embeddings in batch_results.items():
+                title_emb = embeddings["title"]
+                content_emb = embeddings["content"]
+                
+                if title_emb:
+                    title_writer.writerow([file_path, embedding_to_json(title_emb)])
+                    title_raw.write(np.asarray(title_emb, dtype=np.float32).tobytes())
+                    title_paths.append(file_path)
+                    title_count += 1
+                
+                if content_emb:
+                    body_writer.writerow([file_path, embedding_to_json(content_emb)])
+                    body_raw.write(np.asarray(content_emb, dtype=np.float32).tobytes())
+                    body_paths.append(file_path)
+                    body_count += 1
+                
+                # Only files with both rows can be reused next time
+                if title_emb and content_emb:
+                    new_cache[file_path] = embeddings["fingerprint"]
+            
+            title_file.flush()
+            body_file.flush()
+            
+            # Show progress after each batch
+            processed = min(i + BATCH_SIZE, total_files)
+            print(f"Progress: {processed}/{total_files} files ({processed/total_files*100:.1f}%)")
+            
+            # Optional pause between batches (off by default; a local Ollama
+            # does not need throttling)
+            if BATCH_DELAY_MS and i + BATCH_SIZE < len(markdown_files):
+                time.sleep(BATCH_DELAY_MS / 1000)
+    finally:
+        reader.shutdown(cancel_futures=True)
+        for f in (title_file, body_file, old_title_file, old_body_file, title_raw, body_raw):
+            if f is not None:
+                f.close()
+        # Drop the memory maps so the old .npy files can be replaced
+        del old_title_matrix, old_body_matrix
+    
+    os.replace(TITLE_EMBEDDINGS_FILE + ".tmp", TITLE_EMBEDDINGS_FILE)
+    os.replace(BODY_EMBEDDINGS_FILE + ".tmp", BODY_EMBEDDINGS_FILE)
+    for raw, paths, output_file in (
+        (title_raw, title_paths, TITLE_EMBEDDINGS_FILE),
+        (body_raw, body_paths, BODY_EMBEDDINGS_FILE),
+    ):
+        dim = os.path.getsize(raw.name) // (4 * len(paths)) if paths else 0
+        if paths:
+            matrix = np.memmap(raw.name, dtype=np.float32, mode='r', shape=(len(paths), dim))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        write_embeddings_npy(paths, matrix, output_file)
+        del matrix
+        os.remove(raw.name)
+    save_embed_cache(cache_file, new_cache)
+    titles_file = TITLES_FILE or os.path.join(
+        os.path.dirname(TITLE_EMBEDDINGS_FILE) or ".", "titles.json")
+    save_titles(titles_file, {path: entry["heading"] for path, entry in new_cache.items()})
+    index_file = INDEX_FILE or os.path.join(
+        os.path.dirname(BODY_EMBEDDINGS_FILE) or ".", "index.json")
+    save_index(index_file, total_files, directories, listed_at)
     
     elapsed_time = time.time() - start_time
     print(f"Process complete in {elapsed_time:.2f} seconds!")
-    print(f"Generated embeddings for {len(title_embeddings)} titles and {len(body_embeddings)} documents")
+    print(f"Generated embeddings for {title_count} titles and {body_count} documents "
+          f"({reused_count} unchanged files reused)")
     print(f"Title embeddings saved to: {TITLE_EMBEDDINGS_FILE}")
     print(f"Document embeddings saved to: {BODY_EMBEDDINGS_FILE}")
+    print(f"Float32 matrices saved to: {npy_sidecar_paths(TITLE_EMBEDDINGS_FILE)[0]}, "
+          f"{npy_sidecar_paths(BODY_EMBEDDINGS_FILE)[0]}")
 
 
 if __name__ == "__main__":
@@ -14,12 +14,19 @@ import sys
 import json
 import logging
 import argparse
+import atexit
+import contextlib
 import datetime
+import functools
+import heapq
 import math
+import mmap
 import re
 import sqlite3
+import threading
 import time
-from typing import List, Dict, Any, Optional, Tuple, Union, Set, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union, Set, Iterable, Iterator
 from pathlib import Path
 
 # Import FastMCP
@@ -77,6 +84,18 @@ except Exception:
                 return []
         search_thoughts = _SearchThoughtsStub()  # type: ignore
 
+# Optional: Hyperscan compiles keyword_search queries to a DFA scanner
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Optional: orjson encodes/decodes the SR JSON columns, settings file and stats faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -89,6 +108,8 @@ logger = logging.getLogger("thoughts_mcp")
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 BODY_EMBEDDINGS_FILE = os.path.join(SCRIPT_DIR, "thought_embeddings.csv")
 TITLE_EMBEDDINGS_FILE = os.path.join(SCRIPT_DIR, "title_embeddings.csv")
+TITLES_FILE = os.path.join(SCRIPT_DIR, "titles.json")
+INDEX_FILE = os.path.join(SCRIPT_DIR, "index.json")
 THOUGHTS_DIR = "/Users/aidanlowrie/Library/Mobile Documents/iCloud~md~obsidian/Documents/My Brain/1 - Thoughts"
 VAULT_ROOT = Path(THOUGHTS_DIR).resolve().parent
 
@@ -102,6 +123,9 @@ mcp = FastMCP("Thoughts Assistant")
 # Module-level storage for conversation messages
 conversation_messages: List[Dict[str, Any]] = []
 
+# Result files read concurrently by search_by_content
+RESULT_READ_WORKERS = 8
+
 # ----------------------------------------------------------------------
 # Helper functions
 # ----------------------------------------------------------------------
@@ -116,6 +140,88 @@ def _ensure_embeddings_exist() -> bool:
         return False
     return True
 
+
+def _head(path: Union[str, Path], nbytes: int = 4096) -> str:
+    """Return the first `nbytes` of a file, decoded leniently (a cut character becomes U+FFFD)."""
+    with open(path, 'rb') as f:
+        return f.read(nbytes).decode('utf-8', 'replace')
+
+
+# path -> heading title (None: use the file name) written by build_embeddings,
+# with the mtime of TITLES_FILE it was loaded at
+_titles_cache: Optional[Tuple[float, Dict[str, Optional[str]]]] = None
+
+
+def _lookup_title(file_path: str) -> str:
+    """Title of an indexed note from the titles table, reading the note only if it is missing."""
+    global _titles_cache
+    try:
+        mtime = os.path.getmtime(TITLES_FILE)
+    except OSError:
+        return _note_title(file_path)
+    if _titles_cache is None or _titles_cache[0] != mtime:
+        try:
+            with open(TITLES_FILE, 'r', encoding='utf-8') as f:
+                _titles_cache = (mtime, json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading {TITLES_FILE}: {e}")
+            return _note_title(file_path)
+    titles = _titles_cache[1]
+    if file_path not in titles:
+        return _note_title(file_path)
+    return titles[file_path] or Path(file_path).stem
+
+
+def _count_thoughts() -> int:
+    """Number of notes in THOUGHTS_DIR, from the last build's index.json when it is current.
+
+    Adding, removing or renaming a note bumps its directory's mtime, so the
+    index is trusted while none of the directories it was counted in changed
+    after the count; otherwise the vault is walked again.
+    """
+    try:
+        with open(INDEX_FILE, 'rb') as f:
+            index = orjson.loads(f.read()) if orjson is not None else json.load(f)
+        if index.get("thoughts_directory") == THOUGHTS_DIR:
+            updated_at = index["updated_at"]
+            if all(os.stat(d).st_mtime <= updated_at for d in index["directories"]):
+                return int(index["total_thoughts"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return sum(1 for _ in Path(THOUGHTS_DIR).glob("**/*.md"))
+
+
+def _note_title(file_path: Union[str, Path]) -> str:
+    """Title of a note: its first line if that is a heading, else the file name."""
+    try:
+        first_line = _head(file_path).split('\n', 1)[0]
+    except OSError as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return Path(file_path).stem
+    if first_line.startswith('#'):
+        return first_line.lstrip('#').strip()
+    return Path(file_path).stem
+
+
+def _semantic_search(query: str, max_results: int, use_titles: bool) -> List[Tuple[str, float]]:
+    """Embed the query and rank it against the cached title or body embedding matrix."""
+    import search_thoughts
+    
+    embeddings_file = TITLE_EMBEDDINGS_FILE if use_titles else BODY_EMBEDDINGS_FILE
+    query_embedding = search_thoughts.embed_text(query)
+    if not query_embedding:
+        logger.warning(f"Failed to generate embedding for query: {query}")
+        return []
+    
+    # Parsed once per file and reused until the file changes
+    paths, matrix = search_thoughts.load_embedding_matrix(embeddings_file)
+    index = search_thoughts.load_ann_index(embeddings_file, matrix) if search_thoughts.USE_ANN else None
+    if search_thoughts.USE_INT8 and index is None:
+        matrix = search_thoughts.load_int8_matrix(embeddings_file, matrix)
+    elif search_thoughts.USE_FP16 and index is None:
+        matrix = search_thoughts.load_fp16_matrix(embeddings_file, matrix)
+    return search_thoughts.search_preloaded(query_embedding, matrix, paths, max_results, index)
+
 # ----------------------------------------------------------------------
 # MCP tools
 # ----------------------------------------------------------------------
@@ -138,6 +244,8 @@ def build_thought_embeddings(ctx: Context = None) -> str:
         # Set the output file paths in build_embeddings
         build_embeddings.TITLE_EMBEDDINGS_FILE = TITLE_EMBEDDINGS_FILE
         build_embeddings.BODY_EMBEDDINGS_FILE = BODY_EMBEDDINGS_FILE
+        build_embeddings.TITLES_FILE = TITLES_FILE
+        build_embeddings.INDEX_FILE = INDEX_FILE
         
         # Run the build_embeddings main function
         build_embeddings.main()
@@ -154,13 +262,15 @@ def build_thought_embeddings(ctx: Context = None) -> str:
 
 
 @mcp.tool()
-def search_by_content(query: str, max_results: int = 5) -> List[Dict[str, str]]:
+def search_by_content(query: str, max_results: int = 5, include_full_content: bool = False) -> List[Dict[str, str]]:
     """
     Search thoughts by content using semantic similarity.
     
     Args:
         query: The search query
         max_results: Maximum number of results to return (default: 5)
+        include_full_content: Also return each note's full text as "content"
+            (default: False; get_thought_content fetches a single note)
         
     Returns:
         List of matching thoughts with path, title, similarity score, and snippet
@@ -173,38 +283,43 @@ def search_by_content(query: str, max_results: int = 5) -> List[Dict[str, str]]:
         # Import locally to avoid circular imports
         import search_thoughts
         
-        # Set the file paths in search_thoughts
-        search_thoughts.BODY_EMBEDDINGS_FILE = BODY_EMBEDDINGS_FILE
-        search_thoughts.TITLE_EMBEDDINGS_FILE = TITLE_EMBEDDINGS_FILE
+        # Rank against the embedding matrix cached across calls
+        results = _semantic_search(query, max_results, use_titles=False)
         
-        # Call the search_thoughts function with correct parameters
-        results = search_thoughts.search_thoughts(
-            query=query,
-            max_results=max_results,
-            use_titles=False
-        )
+        def read(file_path: str) -> str:
+            if include_full_content:
+                return search_thoughts.get_document_content(file_path)
+            # The snippet only needs the start of the note
+            try:
+                return _head(file_path).replace('\r\n', '\n')
+            except OSError:
+                return search_thoughts.get_document_content(file_path)
+        
+        # Read the result files concurrently (slow, cold iCloud reads overlap)
+        paths = [file_path for file_path, _ in results]
+        if len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(RESULT_READ_WORKERS, len(paths))) as executor:
+                contents = list(executor.map(read, paths))
+        else:
+            contents = [read(file_path) for file_path in paths]
         
         # Format the results with content
         formatted_results = []
-        for file_path, similarity in results:
-            content = search_thoughts.get_document_content(file_path)
-            
-            # Try to extract the title from the content
-            title = Path(file_path).stem
-            content_lines = content.split('\n')
-            if content_lines and content_lines[0].startswith('#'):
-                title = content_lines[0].lstrip('#').strip()
+        for (file_path, similarity), content in zip(results, contents):
+            title = _lookup_title(file_path)
                 
             # Create a snippet (first 200 characters)
             snippet = content[:200] + "..." if len(content) > 200 else content
             
-            formatted_results.append({
+            result = {
                 "path": file_path,
                 "title": title,
                 "similarity": similarity,
-                "snippet": snippet,
-                "content": content
-            })
+                "snippet": snippet
+            }
+            if include_full_content:
+                result["content"] = content
+            formatted_results.append(result)
         
         return formatted_results
     except Exception as e:
@@ -229,34 +344,15 @@ def search_by_title(query: str, max_results: int = 5) -> List[Dict[str, str]]:
         return {"error": "Embedding files not found. Please run build_thought_embeddings first."}
     
     try:
-        # Import locally to avoid circular imports
-        import search_thoughts
-        
-        # Set the file paths in search_thoughts
-        search_thoughts.BODY_EMBEDDINGS_FILE = BODY_EMBEDDINGS_FILE
-        search_thoughts.TITLE_EMBEDDINGS_FILE = TITLE_EMBEDDINGS_FILE
-        
-        # Call the search_thoughts function with correct parameters
-        results = search_thoughts.search_thoughts(
-            query=query,
-            max_results=max_results,
-            use_titles=True
-        )
+        # Rank against the embedding matrix cached across calls
+        results = _semantic_search(query, max_results, use_titles=True)
         
         # Format the results
         formatted_results = []
         for file_path, similarity in results:
-            content = search_thoughts.get_document_content(file_path)
-            
-            # Try to extract the title from the content
-            title = Path(file_path).stem
-            content_lines = content.split('\n')
-            if content_lines and content_lines[0].startswith('#'):
-                title = content_lines[0].lstrip('#').strip()
-            
             formatted_results.append({
                 "path": file_path,
-                "title": title,
+                "title": _lookup_title(file_path),
                 "similarity": similarity
             })
         
@@ -335,6 +431,70 @@ def compare_thoughts(thought1_path: str, thought2_path: str, ctx: Context = None
         return {"error": str(e)}
 
 
+@mcp.tool()
+def compare_thoughts_batch(pairs: List[List[str]], ctx: Context = None) -> List[Dict[str, Any]]:
+    """
+    Compare many pairs of thoughts at once (e.g. to find duplicates).
+    
+    Each file is read and embedded once however many pairs it appears in.
+    
+    Args:
+        pairs: List of [thought1_path, thought2_path] pairs
+    
+    Returns:
+        One entry per pair with both paths and their similarity (None if either
+        file could not be embedded)
+    """
+    if ctx:
+        ctx.info(f"Comparing {len(pairs)} pairs of thoughts")
+    
+    logger.info(f"Comparing {len(pairs)} pairs of thoughts")
+    
+    try:
+        import numpy as np
+        import build_embeddings
+        
+        if any(len(pair) != 2 for pair in pairs):
+            return [{"error": "Each pair must contain exactly two file paths"}]
+        
+        # Embed every distinct file once, EMBED_BATCH_SIZE texts per request
+        unique_paths = list(dict.fromkeys(path for pair in pairs for path in pair))
+        contents = [get_document_content(path) for path in unique_paths]
+        embeddings = build_embeddings.embed_texts(contents)
+        
+        # Normalized rows, so each pair's score is a dot product; files that
+        # could not be embedded keep a zero row and are reported as None
+        dims = {len(e) for e in embeddings if e}
+        dim = dims.pop() if len(dims) == 1 else 0
+        matrix = np.zeros((len(unique_paths), dim), dtype=np.float32)
+        valid = np.zeros(len(unique_paths), dtype=bool)
+        for row, embedding in enumerate(embeddings):
+            if embedding and len(embedding) == dim:
+                matrix[row] = embedding
+                valid[row] = True
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        valid &= norms[:, 0] > 0
+        matrix /= np.where(norms > 0, norms, 1)
+        
+        index = {path: row for row, path in enumerate(unique_paths)}
+        left = np.array([index[a] for a, _ in pairs], dtype=np.intp)
+        right = np.array([index[b] for _, b in pairs], dtype=np.intp)
+        scores = np.einsum('ij,ij->i', matrix[left], matrix[right])
+        ok = valid[left] & valid[right]
+        
+        return [
+            {
+                "thought1": a,
+                "thought2": b,
+                "similarity": float(score) if good else None
+            }
+            for (a, b), score, good in zip(pairs, scores.tolist(), ok.tolist())
+        ]
+    except Exception as e:
+        logger.error(f"Error comparing thoughts: {e}")
+        return [{"error": str(e)}]
+
+
 @mcp.tool()
 def list_recent_thoughts(limit: int = 5, ctx: Context = None) -> List[Dict[str, Any]]:
     """
@@ -344,39 +504,32 @@ def list_recent_thoughts(limit: int = 5, ctx: Context = None) -> List[Dict[str,
         limit: Maximum number of thoughts to return (default: 5)
     
     Returns:
-        List of recent thoughts with path and modification time
+        List of recent thoughts with path, title and modification time
+        (fetch a note's text with get_thought_content)
     """
     if ctx:
         ctx.info(f"Listing {limit} recent thoughts")
     
     logger.info(f"Listing {limit} recent thoughts")
     
-    # Get all markdown files in the thoughts directory
-    md_files = list(Path(THOUGHTS_DIR).glob("**/*.md"))
-    
-    # Sort by modification time (newest first)
-    md_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
+    def mtimes():
+        for entry in _iter_md_entries(THOUGHTS_DIR):
+            try:
+                yield entry.stat().st_mtime, entry.path
+            except OSError:
+                continue
     
-    # Limit the results
-    md_files = md_files[:limit]
+    # Keep only the newest `limit` files (same order as a stable sort, newest first)
+    recent = heapq.nlargest(limit, mtimes(), key=lambda item: item[0])
     
     # Format the results
     results = []
-    for file_path in md_files:
-        mtime = file_path.stat().st_mtime
-        content = get_document_content(file_path)
-        
-        # Try to extract the title from the content
-        title = file_path.stem
-        content_lines = content.split('\n')
-        if content_lines and content_lines[0].startswith('#'):
-            title = content_lines[0].lstrip('#').strip()
-        
+    for mtime, path in recent:
+        # Only the head of each file is read; use get_thought_content for the rest
         results.append({
-            "path": str(file_path),
-            "title": title,
-            "modified_timestamp": mtime,
-            "content": content
+            "path": path,
+            "title": _note_title(path),
+            "modified_timestamp": mtime
         })
     
     return results
@@ -499,23 +652,22 @@ def write_note(content: str, title: str = None, frontmatter: Dict[str, Any] = No
                 logger.warning(f"Removing reserved frontmatter property: {reserved}")
                 del frontmatter[reserved]
         
-        # Create the YAML frontmatter
-        yaml_frontmatter = "---\n"
+        # Create the YAML frontmatter as a list of lines joined once
+        lines = ["---"]
+        append = lines.append
         for key, value in frontmatter.items():
             if isinstance(value, list):
-                yaml_frontmatter += f"{key}:\n"
-                for item in value:
-                    yaml_frontmatter += f"  - {item}\n"
+                append(f"{key}:")
+                lines.extend([f"  - {item}" for item in value])
             elif isinstance(value, bool):
-                yaml_frontmatter += f"{key}: {str(value).lower()}\n"
+                append(f"{key}: {'true' if value else 'false'}")
             else:
-                yaml_frontmatter += f"{key}: {value}\n"
-        yaml_frontmatter += "---\n\n"
+                append(f"{key}: {value}")
+        append("---\n\n")
         
-        # Write the file
+        # Write the file in a single call
         with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(yaml_frontmatter)
-            f.write(content)
+            f.write("\n".join(lines) + content)
         
         logger.info(f"Successfully wrote note to {file_path}")
         
@@ -536,6 +688,121 @@ def write_note(content: str, title: str = None, frontmatter: Dict[str, Any] = No
         }
 
 
+def _iter_md_entries(root: str) -> Iterator[os.DirEntry]:
+    """Yield a DirEntry for every .md file under root, in the order Path.glob("**/*.md") uses.
+
+    Like glob, symlinked directories are not descended into; unlike it, .md
+    entries that aren't files (directories, broken links) are skipped.
+    """
+    subdirs = []
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(".md") and entry.is_file():
+                    yield entry
+    except OSError as e:
+        logger.error(f"Error listing {root}: {e}")
+        return
+    for subdir in subdirs:
+        yield from _iter_md_entries(subdir)
+
+
+# Files read and scanned concurrently by keyword_search
+KEYWORD_SEARCH_WORKERS = 8
+
+
+class _HyperscanPattern:
+    """Minimal re.Pattern stand-in whose search() runs a compiled Hyperscan database."""
+
+    def __init__(self, literal: bytes, caseless: bool):
+        # Hyperscan takes PCRE syntax; \xHH escapes keep the query a plain literal
+        expression = "".join(f"\\x{byte:02x}" for byte in literal).encode("ascii")
+        flags = hyperscan.HS_FLAG_SINGLEMATCH | (hyperscan.HS_FLAG_CASELESS if caseless else 0)
+        self._db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        self._db.compile(expressions=[expression], ids=[0], elements=1, flags=[flags])
+        self._local = threading.local()  # a scratch space can only be used by one scan at a time
+
+    def search(self, data) -> Optional[bool]:
+        found = []
+
+        def on_match(_id, _start, _end, _flags, _context):
+            found.append(True)
+            return True  # stop scanning at the first match
+
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = hyperscan.Scratch(self._db)
+        try:
+            self._db.scan(data, match_event_handler=on_match, scratch=scratch)
+        except hyperscan.ScanTerminated:
+            pass
+        return True if found else None
+
+
+def _keyword_prefilter(query: str, case_sensitive: bool):
+    """Compile a bytes pattern that finds query in raw file bytes, if one is exact.
+
+    Uses Hyperscan when it is installed and re otherwise; both expose search().
+    """
+    if not case_sensitive and not query.isascii():
+        return None  # caseless bytes matching only folds ASCII; decode and .lower() instead
+    literal = query.encode("utf-8")
+    if hyperscan is not None and literal:
+        return _HyperscanPattern(literal, caseless=not case_sensitive)
+    return re.compile(re.escape(literal), 0 if case_sensitive else re.IGNORECASE)
+
+
+def _keyword_scan_file(file_path: str, pattern, search_query: str,
+                       case_sensitive: bool) -> Optional[Dict[str, Any]]:
+    """Return the keyword_search result for one file, or None if it doesn't match."""
+    with open(file_path, 'rb') as f:
+        if pattern is not None and os.fstat(f.fileno()).st_size:
+            # Scan the mapped bytes so files without a match are never decoded
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if pattern.search(mm) is None:
+                    return None
+            f.seek(0)
+        raw = f.read()
+    # Same text open(..., 'r') would give, universal newlines included
+    content = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    
+    # Perform search based on case sensitivity
+    searchable_content = content if case_sensitive else content.lower()
+    
+    if search_query not in searchable_content:
+        return None
+    
+    # Extract title from content
+    title = Path(file_path).stem
+    content_lines = content.split('\n')
+    if content_lines and content_lines[0].startswith('#'):
+        title = content_lines[0].lstrip('#').strip()
+    
+    # Find context around the match
+    match_index = searchable_content.find(search_query)
+    start_index = max(0, match_index - 100)
+    end_index = min(len(content), match_index + len(search_query) + 100)
+    
+    # Extract context
+    if start_index > 0:
+        context = "..." + content[start_index:end_index] + "..."
+    else:
+        context = content[start_index:end_index] + "..."
+    
+    # Highlight match in context (preserve original case)
+    match_text = content[match_index:match_index + len(search_query)]
+    highlighted_context = context.replace(match_text, f"**{match_text}**")
+    
+    return {
+        "path": file_path,
+        "title": title,
+        "match_context": highlighted_context,
+        "full_content": content
+    }
+
+
 @mcp.tool()
 def keyword_search(query: str, max_results: int = 10, case_sensitive: bool = False, folder_path: str = None, ctx: Context = None) -> List[Dict[str, Any]]:
     """
@@ -571,61 +838,38 @@ def keyword_search(query: str, max_results: int = 10, case_sensitive: bool = Fal
             return [{"error": f"Search directory not found: {search_dir}"}]
         
         # Find all markdown files in the specified directory
-        md_files = list(search_dir.glob("**/*.md"))
+        md_files = [entry.path for entry in _iter_md_entries(str(search_dir))]
         
         if not md_files:
             return [{"error": f"No markdown files found in {search_dir}"}]
         
         # Convert query to lowercase if not case sensitive
         search_query = query if case_sensitive else query.lower()
+        pattern = _keyword_prefilter(query, case_sensitive)
         
         # Results container
         results = []
         
-        # Search through files
-        for file_path in md_files:
+        def scan(file_path: str) -> Optional[Dict[str, Any]]:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Perform search based on case sensitivity
-                searchable_content = content if case_sensitive else content.lower()
-                
-                if search_query in searchable_content:
-                    # Extract title from content
-                    title = file_path.stem
-                    content_lines = content.split('\n')
-                    if content_lines and content_lines[0].startswith('#'):
-                        title = content_lines[0].lstrip('#').strip()
-                    
-                    # Find context around the match
-                    match_index = searchable_content.find(search_query)
-                    start_index = max(0, match_index - 100)
-                    end_index = min(len(content), match_index + len(search_query) + 100)
-                    
-                    # Extract context
-                    if start_index > 0:
-                        context = "..." + content[start_index:end_index] + "..."
-                    else:
-                        context = content[start_index:end_index] + "..."
-                    
-                    # Highlight match in context (preserve original case)
-                    match_text = content[match_index:match_index + len(search_query)]
-                    highlighted_context = context.replace(match_text, f"**{match_text}**")
-                    
-                    results.append({
-                        "path": str(file_path),
-                        "title": title,
-                        "match_context": highlighted_context,
-                        "full_content": content
-                    })
+                return _keyword_scan_file(file_path, pattern, search_query, case_sensitive)
+            except Exception as e:
+                logger.error(f"Error searching file {file_path}: {e}")
+                return None
+        
+        # Search through files concurrently; map() yields in file order, so the
+        # results are the same first max_results matches as a serial scan
+        executor = ThreadPoolExecutor(max_workers=min(KEYWORD_SEARCH_WORKERS, len(md_files)))
+        try:
+            for result in executor.map(scan, md_files):
+                if result is not None:
+                    results.append(result)
                     
                     # Break early if we've reached max results
                     if len(results) >= max_results:
                         break
-            except Exception as e:
-                logger.error(f"Error searching file {file_path}: {e}")
-                continue
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
         if not results:
             return [{"message": f"No matches found for query: {query}"}]
@@ -644,9 +888,33 @@ SR_DB_PATH = os.path.join(PLUGIN_DIR, "spaced_repetition.sqlite")
 SETTINGS_PATH = os.path.join(PLUGIN_DIR, "data.json")
 BOOLEAN_TRUE = 1
 BOOLEAN_FALSE = 0
+_BOOL = (BOOLEAN_FALSE, BOOLEAN_TRUE)  # indexed by bool(flag)
 DB_VERSION = 3
 
+# Optional: compile the card-id hash loop with numba when it is installed
+try:
+    import numba
+    import numpy as np
+
+    # numba's on-disk cache looks the module up by name, which fails when a
+    # runner (fastmcp run, mcp install) loads this file without registering
+    # it in sys.modules; compile in memory then
+    @numba.njit(cache=__name__ in sys.modules)
+    def _jsh(buf):
+        h = np.uint32(0)
+        for i in range(buf.shape[0]):
+            # numba widens uint32 * uint32 + uint32 to 64 bits, so cast back on
+            # every step to wrap like & 0xFFFFFFFF
+            h = np.uint32(h * np.uint32(31) + np.uint32(buf[i]))
+        return h
+except ImportError:
+    _jsh = None
+
 def _js_style_hash(text: str) -> str:
+    if _jsh is not None:
+        # One uint32 per code point, the same values ord() yields below
+        h = int(_jsh(np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)))
+        return f"card_{h:08x}"
     h = 0
     for ch in text:
         h = (h * 31 + ord(ch)) & 0xFFFFFFFF
@@ -655,113 +923,165 @@ def _js_style_hash(text: str) -> str:
 def _normalize_note_path(path: str) -> str:
     if path is None:
         return ""
+    # Fast path: a clean path (no backslashes, empty or dot segments,
+    # trailing slash or surrounding whitespace) is already normalized
+    if (isinstance(path, str) and path and "\\" not in path and "//" not in path
+            and "/." not in path and path[0] != "." and path[-1] != "/"
+            and not path[0].isspace() and not path[-1].isspace()):
+        return path
     norm = os.path.normpath(str(path)).replace("\\", "/").strip()
     if norm.startswith("./"):
         norm = norm[2:]
     return norm
 
-def _sr_connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(SR_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    _sr_initialize_schema(conn)
-    _sr_ensure_meta_defaults(conn)
-    _sr_ensure_deck(conn, "default", "Default")
-    return conn
+# One connection per process; the schema and defaults are set up when it opens
+_SR_CONN: Optional[sqlite3.Connection] = None
+_SR_LOCK = threading.RLock()
+
+# Separate read-only connection for the tools that only query, so they don't
+# wait on _SR_LOCK behind a write (WAL lets readers run alongside the writer)
+_SR_RO_CONN: Optional[sqlite3.Connection] = None
+_SR_RO_LOCK = threading.Lock()
+
+_SR_MIN_SQLITE = (3, 33, 0)
+
+def _sr_close() -> None:
+    global _SR_CONN, _SR_RO_CONN
+    if _SR_RO_CONN is not None:
+        _SR_RO_CONN.close()
+        _SR_RO_CONN = None
+    if _SR_CONN is not None:
+        _SR_CONN.close()  # also checkpoints the WAL back into the main file
+        _SR_CONN = None
+
+atexit.register(_sr_close)
+
+@contextlib.contextmanager
+def _sr_connect() -> Iterator[sqlite3.Connection]:
+    """Yield the shared SR connection, holding _SR_LOCK for one transaction."""
+    global _SR_CONN
+    with _SR_LOCK:
+        if _SR_CONN is None:
+            if sqlite3.sqlite_version_info < _SR_MIN_SQLITE:
+                # delete_sr_deck renumbers positions with UPDATE ... FROM
+                raise RuntimeError(
+                    f"The SR store needs SQLite {'.'.join(map(str, _SR_MIN_SQLITE))}+, "
+                    f"but Python is linked against {sqlite3.sqlite_version}"
+                )
+            # timeout sets busy_timeout; the larger statement cache keeps every SR query prepared
+            conn = sqlite3.connect(SR_DB_PATH, timeout=5.0, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON;")
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            conn.execute("PRAGMA cache_size=-65536;")  # 64 MB page cache
+            conn.execute("PRAGMA mmap_size=2147483648;")
+            with conn:
+                _sr_initialize_schema(conn)
+                _sr_ensure_meta_defaults(conn)
+                _sr_ensure_deck(conn, "default", "Default")
+            _SR_CONN = conn
+        with _SR_CONN:
+            yield _SR_CONN
+
+@contextlib.contextmanager
+def _sr_connect_ro() -> Iterator[sqlite3.Connection]:
+    """Yield the shared read-only SR connection, holding _SR_RO_LOCK."""
+    global _SR_RO_CONN
+    with _SR_RO_LOCK:
+        if _SR_RO_CONN is None:
+            with _sr_connect():  # creates the file and schema on first use
+                pass
+            uri = Path(os.path.abspath(SR_DB_PATH)).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=5.0, check_same_thread=False, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only=1;")
+            conn.execute("PRAGMA cache_size=-65536;")
+            conn.execute("PRAGMA mmap_size=2147483648;")
+            _SR_RO_CONN = conn
+        yield _SR_RO_CONN
+
+# Every table and index of the SR store, created in one executescript() call
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS decks (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    folder_path TEXT NOT NULL DEFAULT '',
+    is_composite INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    note_path TEXT NOT NULL,
+    block_id TEXT,
+    type TEXT NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    irreversible INTEGER NOT NULL DEFAULT 0,
+    examples_json TEXT,
+    choices_json TEXT,
+    correct_choice_id TEXT,
+    correct_choice_ids_json TEXT,
+    shuffle_choices INTEGER NOT NULL DEFAULT 0,
+    multi_select INTEGER NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    interval REAL NOT NULL DEFAULT 0,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    due INTEGER NOT NULL,
+    suspended INTEGER NOT NULL DEFAULT 0,
+    fsrs_stability REAL,
+    fsrs_difficulty REAL,
+    fsrs_card_json TEXT,
+    reviews_json TEXT,
+    verb_stats_json TEXT,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS card_decks (
+    card_id TEXT NOT NULL,
+    deck_id TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(card_id, deck_id),
+    FOREIGN KEY(card_id) REFERENCES cards(id) ON DELETE CASCADE,
+    FOREIGN KEY(deck_id) REFERENCES decks(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS deck_children (
+    parent_id TEXT NOT NULL,
+    child_id TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(parent_id, child_id),
+    FOREIGN KEY(parent_id) REFERENCES decks(id) ON DELETE CASCADE,
+    FOREIGN KEY(child_id) REFERENCES decks(id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS note_deck_links (
+    note_path TEXT NOT NULL,
+    deck_id TEXT NOT NULL,
+    PRIMARY KEY(note_path, deck_id),
+    FOREIGN KEY(deck_id) REFERENCES decks(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_cards_due ON cards(due);
+CREATE INDEX IF NOT EXISTS idx_card_decks_deck ON card_decks(deck_id);
+CREATE INDEX IF NOT EXISTS idx_note_links_note ON note_deck_links(note_path);
+CREATE INDEX IF NOT EXISTS idx_deck_children_parent ON deck_children(parent_id);
+CREATE INDEX IF NOT EXISTS idx_deck_children_child ON deck_children(child_id);
+CREATE INDEX IF NOT EXISTS idx_card_decks_deck_card ON card_decks(deck_id, card_id);
+CREATE INDEX IF NOT EXISTS idx_card_decks_card_position ON card_decks(card_id, position, deck_id);
+CREATE INDEX IF NOT EXISTS idx_note_links_deck ON note_deck_links(deck_id);
+CREATE INDEX IF NOT EXISTS idx_cards_updated ON cards(updated_at);
+-- Covered by idx_card_decks_card_position and the primary key
+DROP INDEX IF EXISTS idx_card_decks_card;
+"""
 
 def _sr_initialize_schema(conn: sqlite3.Connection) -> None:
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS meta (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        );
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS decks (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            created_at INTEGER NOT NULL,
-            folder_path TEXT NOT NULL DEFAULT '',
-            is_composite INTEGER NOT NULL DEFAULT 0
-        );
-        """
-    )
+    conn.executescript(_SCHEMA_SQL)
+    # Decks created by older versions lack the folder/composite columns
     _sr_ensure_deck_schema(conn)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS cards (
-            id TEXT PRIMARY KEY,
-            note_path TEXT NOT NULL,
-            block_id TEXT,
-            type TEXT NOT NULL,
-            front TEXT NOT NULL,
-            back TEXT NOT NULL,
-            irreversible INTEGER NOT NULL DEFAULT 0,
-            examples_json TEXT,
-            choices_json TEXT,
-            correct_choice_id TEXT,
-            correct_choice_ids_json TEXT,
-            shuffle_choices INTEGER NOT NULL DEFAULT 0,
-            multi_select INTEGER NOT NULL DEFAULT 0,
-            ease REAL NOT NULL DEFAULT 2.5,
-            interval REAL NOT NULL DEFAULT 0,
-            repetitions INTEGER NOT NULL DEFAULT 0,
-            lapses INTEGER NOT NULL DEFAULT 0,
-            due INTEGER NOT NULL,
-            suspended INTEGER NOT NULL DEFAULT 0,
-            fsrs_stability REAL,
-            fsrs_difficulty REAL,
-            fsrs_card_json TEXT,
-            reviews_json TEXT,
-            verb_stats_json TEXT,
-            created_at INTEGER NOT NULL,
-            updated_at INTEGER NOT NULL
-        );
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS card_decks (
-            card_id TEXT NOT NULL,
-            deck_id TEXT NOT NULL,
-            position INTEGER NOT NULL DEFAULT 0,
-            PRIMARY KEY(card_id, deck_id),
-            FOREIGN KEY(card_id) REFERENCES cards(id) ON DELETE CASCADE,
-            FOREIGN KEY(deck_id) REFERENCES decks(id) ON DELETE CASCADE
-        );
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS deck_children (
-            parent_id TEXT NOT NULL,
-            child_id TEXT NOT NULL,
-            position INTEGER NOT NULL DEFAULT 0,
-            PRIMARY KEY(parent_id, child_id),
-            FOREIGN KEY(parent_id) REFERENCES decks(id) ON DELETE CASCADE,
-            FOREIGN KEY(child_id) REFERENCES decks(id) ON DELETE CASCADE
-        );
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS note_deck_links (
-            note_path TEXT NOT NULL,
-            deck_id TEXT NOT NULL,
-            PRIMARY KEY(note_path, deck_id),
-            FOREIGN KEY(deck_id) REFERENCES decks(id) ON DELETE CASCADE
-        );
-        """
-    )
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_cards_due ON cards(due);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_card_decks_deck ON card_decks(deck_id);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_card_decks_card ON card_decks(card_id);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_note_links_note ON note_deck_links(note_path);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_deck_children_parent ON deck_children(parent_id);")
-    conn.execute("CREATE INDEX IF NOT EXISTS idx_deck_children_child ON deck_children(child_id);")
 
 def _sr_ensure_deck_schema(conn: sqlite3.Connection) -> None:
     try:
@@ -786,28 +1106,44 @@ def _sr_today_rollover_timestamp() -> int:
     midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
     return int(midnight.timestamp() * 1000)
 
+# Shared SQL text, so sqlite3's per-connection statement cache reuses the plans
+_GET_META_SQL = "SELECT value FROM meta WHERE key = ? LIMIT 1"
+_SET_META_SQL = (
+    "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+)
+
 def _sr_get_meta(conn: sqlite3.Connection, key: str) -> Optional[str]:
-    row = conn.execute("SELECT value FROM meta WHERE key = ? LIMIT 1", (key,)).fetchone()
+    row = conn.execute(_GET_META_SQL, (key,)).fetchone()
     if not row:
         return None
     return str(row["value"])
 
 def _sr_set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
-    conn.execute(
-        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
-        (key, value),
-    )
+    conn.execute(_SET_META_SQL, (key, value))
 
 def _sr_ensure_meta_defaults(conn: sqlite3.Connection) -> None:
-    version = _sr_get_meta(conn, "version")
-    if version != str(DB_VERSION):
-        _sr_set_meta(conn, "version", str(DB_VERSION))
-    last_rollover = _sr_get_meta(conn, "lastRollover")
-    if not last_rollover:
-        _sr_set_meta(conn, "lastRollover", str(_sr_today_rollover_timestamp()))
+    rows = conn.execute(
+        "SELECT key, value FROM meta WHERE key IN ('version', 'lastRollover')"
+    ).fetchall()
+    current = {str(row["key"]): str(row["value"]) for row in rows}
+    updates = []
+    if current.get("version") != str(DB_VERSION):
+        updates.append(("version", str(DB_VERSION)))
+    if not current.get("lastRollover"):
+        updates.append(("lastRollover", str(_sr_today_rollover_timestamp())))
+    if updates:
+        conn.executemany(_SET_META_SQL, updates)
+
+_DECK_EXISTS_SQL = "SELECT 1 FROM decks WHERE id = ? LIMIT 1"
+_INSERT_DECK_SQL = "INSERT INTO decks (id, name, created_at, folder_path, is_composite) VALUES (?, ?, ?, ?, 0)"
+_FIND_DECK_BY_NAME_SQL = "SELECT id FROM decks WHERE name = ? COLLATE NOCASE LIMIT 1"
+_DECK_CHILDREN_SQL = "SELECT child_id FROM deck_children WHERE parent_id = ? ORDER BY position"
+_INSERT_CARD_DECK_SQL = "INSERT INTO card_decks (card_id, deck_id, position) VALUES (?, ?, ?)"
+_INSERT_NOTE_LINK_SQL = "INSERT OR IGNORE INTO note_deck_links (note_path, deck_id) VALUES (?, ?)"
+_NOTE_DECK_IDS_SQL = "SELECT deck_id FROM note_deck_links WHERE note_path = ? ORDER BY rowid"
 
 def _sr_deck_exists(conn: sqlite3.Connection, deck_id: str) -> bool:
-    row = conn.execute("SELECT 1 FROM decks WHERE id = ? LIMIT 1", (deck_id,)).fetchone()
+    row = conn.execute(_DECK_EXISTS_SQL, (deck_id,)).fetchone()
     return bool(row)
 
 def _sr_ensure_deck(conn: sqlite3.Connection, deck_id: Optional[str], name: Optional[str] = None) -> str:
@@ -816,30 +1152,31 @@ def _sr_ensure_deck(conn: sqlite3.Connection, deck_id: Optional[str], name: Opti
         return did
     now_ms = int(time.time() * 1000)
     deck_name = (name or ("Default" if did == "default" else did)).strip() or did
-    conn.execute(
-        "INSERT INTO decks (id, name, created_at, folder_path, is_composite) VALUES (?, ?, ?, ?, 0)",
-        (did, deck_name, now_ms, ""),
-    )
+    conn.execute(_INSERT_DECK_SQL, (did, deck_name, now_ms, ""))
     return did
 
 def _sr_find_deck_by_name(conn: sqlite3.Connection, name: str) -> Optional[str]:
     clean = (name or "").strip()
     if not clean:
         return None
-    row = conn.execute(
-        "SELECT id FROM decks WHERE name = ? COLLATE NOCASE LIMIT 1",
-        (clean,),
-    ).fetchone()
+    row = conn.execute(_FIND_DECK_BY_NAME_SQL, (clean,)).fetchone()
     return str(row["id"]) if row else None
 
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+
 def _sr_generate_deck_id_from_name(conn: sqlite3.Connection, name: str) -> str:
-    base = re.sub(r"[^a-z0-9]+", "-", (name or "deck").lower()).strip("-") or "deck"
-    candidate = base
+    base = _SLUG_RE.sub("-", (name or "deck").lower()).strip("-") or "deck"
+    # Slugs are [a-z0-9-] only, so base needs no GLOB escaping
+    taken = {
+        str(row["id"])
+        for row in conn.execute("SELECT id FROM decks WHERE id = ? OR id GLOB ?", (base, f"{base}-*"))
+    }
+    if base not in taken:
+        return base
     suffix = 2
-    while _sr_deck_exists(conn, candidate):
-        candidate = f"{base}-{suffix}"
+    while f"{base}-{suffix}" in taken:
         suffix += 1
-    return candidate
+    return f"{base}-{suffix}"
 
 def _sr_ensure_deck_by_name(conn: sqlite3.Connection, name: str) -> str:
     clean = (name or "Deck").strip()
@@ -851,10 +1188,7 @@ def _sr_ensure_deck_by_name(conn: sqlite3.Connection, name: str) -> str:
     return deck_id
 
 def _sr_get_composite_children(conn: sqlite3.Connection, deck_id: str) -> List[str]:
-    rows = conn.execute(
-        "SELECT child_id FROM deck_children WHERE parent_id = ? ORDER BY position",
-        (deck_id,),
-    ).fetchall()
+    rows = conn.execute(_DECK_CHILDREN_SQL, (deck_id,)).fetchall()
     return [str(row["child_id"]) for row in rows]
 
 
@@ -874,22 +1208,18 @@ def _sr_get_deck(conn: sqlite3.Connection, deck_id: str) -> Optional[Dict[str, A
     }
 
 def _sr_sanitize_deck_ids(deck_ids: Iterable[Any]) -> List[str]:
-    seen: Set[str] = set()
-    result: List[str] = []
-    for did in deck_ids:
-        if not isinstance(did, str):
-            continue
-        clean = did.strip()
-        if not clean:
-            continue
-        if clean not in seen:
-            seen.add(clean)
-            result.append(clean)
-    return result
+    # Stripped, non-empty string ids, de-duplicated in first-seen order
+    stripped = (did.strip() for did in deck_ids if isinstance(did, str))
+    return list(dict.fromkeys(did for did in stripped if did))
 
 def _sr_dump_json(value: Any) -> Optional[str]:
     if value is None:
         return None
+    if orjson is not None:
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            pass  # e.g. non-str keys or big ints, which json.dumps still accepts
     try:
         return json.dumps(value, ensure_ascii=False)
     except TypeError:
@@ -899,10 +1229,19 @@ def _sr_parse_json(payload: Optional[str]) -> Any:
     if not payload:
         return None
     try:
-        return json.loads(payload)
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
     except Exception:
         return None
 
+@functools.lru_cache(maxsize=4096)
+def _sr_parse_json_cached(payload: Optional[str]) -> Any:
+    """_sr_parse_json memoized on the payload text.
+
+    Used for the large reviews and FSRS columns, which are re-read unchanged on
+    every inspect. The parsed value is shared between calls; don't mutate it.
+    """
+    return _sr_parse_json(payload)
+
 def _sr_float(value: Any, default: float) -> float:
     if isinstance(value, (int, float)) and math.isfinite(value):
         return float(value)
@@ -918,125 +1257,153 @@ def _sr_int(value: Any, default: int) -> int:
         return int(value)
     return int(default)
 
-def _sr_get_deck_ids_for_card(conn: sqlite3.Connection, card_id: str) -> List[str]:
-    rows = conn.execute(
-        "SELECT deck_id FROM card_decks WHERE card_id = ? ORDER BY position",
-        (card_id,),
-    ).fetchall()
-    return [str(row["deck_id"]) for row in rows]
+# SQLite caps bound parameters per statement; IN (...) lists are issued in chunks
+_SR_IN_CHUNK = 900
+
+def _sr_chunks(items: List[Any], size: int = _SR_IN_CHUNK) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _sr_get_deck_ids_for_cards(conn: sqlite3.Connection, card_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """Map each card id to its deck ids (primary first) with one query per chunk."""
+    deck_map: Dict[str, List[str]] = {}
+    for chunk in _sr_chunks(list(dict.fromkeys(card_ids))):
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT card_id, deck_id FROM card_decks WHERE card_id IN ({placeholders}) ORDER BY card_id, position",
+            chunk,
+        )
+        for row in rows:
+            deck_map.setdefault(str(row["card_id"]), []).append(str(row["deck_id"]))
+    return deck_map
+
+# Every cards column except reviews_json, for reads that don't return reviews
+_CARD_COLUMNS_NO_REVIEWS = ", ".join(
+    f"c.{col}" for col in (
+        "id", "note_path", "block_id", "type", "front", "back", "irreversible", "examples_json",
+        "choices_json", "correct_choice_id", "correct_choice_ids_json", "shuffle_choices",
+        "multi_select", "ease", "interval", "repetitions", "lapses", "due", "suspended",
+        "fsrs_stability", "fsrs_difficulty", "fsrs_card_json", "verb_stats_json",
+        "created_at", "updated_at",
+    )
+)
 
-def _sr_upsert_card(conn: sqlite3.Connection, card: Dict[str, Any]) -> Dict[str, Any]:
-    normalized_path = _normalize_note_path(card.get("notePath", card.get("note_path", "")))
-    deck_id_candidates: List[str] = []
-    for raw in card.get("deckIds") or []:
-        if isinstance(raw, str) and raw.strip():
-            deck_id_candidates.append(_sr_ensure_deck(conn, raw.strip()))
+# Columns in the order _sr_card_row() builds them; created_at is only set on insert
+_UPSERT_CARD_SQL = """
+    INSERT INTO cards (
+        id, note_path, block_id, type, front, back, irreversible, examples_json, choices_json,
+        correct_choice_id, correct_choice_ids_json, shuffle_choices, multi_select, ease, interval,
+        repetitions, lapses, due, suspended, fsrs_stability, fsrs_difficulty, fsrs_card_json,
+        reviews_json, verb_stats_json, created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        note_path = excluded.note_path,
+        block_id = excluded.block_id,
+        type = excluded.type,
+        front = excluded.front,
+        back = excluded.back,
+        irreversible = excluded.irreversible,
+        examples_json = excluded.examples_json,
+        choices_json = excluded.choices_json,
+        correct_choice_id = excluded.correct_choice_id,
+        correct_choice_ids_json = excluded.correct_choice_ids_json,
+        shuffle_choices = excluded.shuffle_choices,
+        multi_select = excluded.multi_select,
+        ease = excluded.ease,
+        interval = excluded.interval,
+        repetitions = excluded.repetitions,
+        lapses = excluded.lapses,
+        due = excluded.due,
+        suspended = excluded.suspended,
+        fsrs_stability = excluded.fsrs_stability,
+        fsrs_difficulty = excluded.fsrs_difficulty,
+        fsrs_card_json = excluded.fsrs_card_json,
+        reviews_json = excluded.reviews_json,
+        verb_stats_json = excluded.verb_stats_json,
+        updated_at = excluded.updated_at
+"""
+
+def _sr_existing_card_ids(conn: sqlite3.Connection, card_ids: Iterable[str]) -> Set[str]:
+    found: Set[str] = set()
+    for chunk in _sr_chunks(list(dict.fromkeys(card_ids))):
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(f"SELECT id FROM cards WHERE id IN ({placeholders})", chunk)
+        found.update(str(row["id"]) for row in rows)
+    return found
+
+def _sr_pick(card: Dict[str, Any], camel: str, snake: str, default: Any = None) -> Any:
+    """card.get(camel, card.get(snake, default)) without the second lookup when camel is set."""
+    return card[camel] if camel in card else card.get(snake, default)
+
+def _sr_card_row(card: Dict[str, Any]) -> Tuple[tuple, List[tuple], Dict[str, Any]]:
+    """Build the cards row and card_decks rows for *card* without touching the DB.
+
+    The deck ids on the card must already exist. Returns (card_row, deck_link_rows,
+    result) where result carries id, deckIds and notePath.
+    """
+    get = card.get
+    normalized_path = _normalize_note_path(_sr_pick(card, "notePath", "note_path", ""))
+    deck_id_candidates = _sr_sanitize_deck_ids(get("deckIds") or [])
     if not deck_id_candidates:
-        single = card.get("deckId") or card.get("deck_id")
+        single = get("deckId") or get("deck_id")
         if isinstance(single, str) and single.strip():
-            deck_id_candidates.append(_sr_ensure_deck(conn, single.strip()))
-    deck_id_candidates = _sr_sanitize_deck_ids(deck_id_candidates)
+            deck_id_candidates.append(single.strip())
     if not deck_id_candidates:
-        deck_id_candidates = [_sr_ensure_deck(conn, "default", "Default")]
+        deck_id_candidates = ["default"]
     primary_deck = deck_id_candidates[0]
 
-    front = str(card.get("front", "")).strip()
-    back = str(card.get("back", "")).strip()
+    front = str(get("front", "")).strip()
+    back = str(get("back", "")).strip()
     if not front:
         raise ValueError("Card is missing required 'front' text")
     if back == "":
         back = "..."
 
-    existing_row = conn.execute(
-        "SELECT created_at FROM cards WHERE id = ? LIMIT 1",
-        (card.get("id"),),
-    ).fetchone() if card.get("id") else None
-    generated_id = _js_style_hash(f"{primary_deck}\n{card.get('type', 'basic')}\n{front}\n{back}")
-    card_id = str(card.get("id") or generated_id)
+    card_type = get("type", "basic")
+    generated_id = _js_style_hash(f"{primary_deck}\n{card_type}\n{front}\n{back}")
+    card_id = str(get("id") or generated_id)
     now_ms = int(time.time() * 1000)
-    created_source = card.get("createdAt", card.get("created_at"))
-    if created_source is None and existing_row is not None:
-        created_source = existing_row["created_at"]
-    created_at = _sr_int(created_source, now_ms)
-    updated_at = _sr_int(card.get("updatedAt", card.get("updated_at")), now_ms)
+    # An existing row keeps its created_at (the UPSERT never updates it), so
+    # there is no need to read it back first
+    created_at = _sr_int(_sr_pick(card, "createdAt", "created_at"), now_ms)
+    updated_at = _sr_int(_sr_pick(card, "updatedAt", "updated_at"), now_ms)
     if updated_at <= 0:
         updated_at = now_ms
 
-    conn.execute(
-        """
-        INSERT INTO cards (
-            id, note_path, block_id, type, front, back, irreversible, examples_json, choices_json,
-            correct_choice_id, correct_choice_ids_json, shuffle_choices, multi_select, ease, interval,
-            repetitions, lapses, due, suspended, fsrs_stability, fsrs_difficulty, fsrs_card_json,
-            reviews_json, verb_stats_json, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(id) DO UPDATE SET
-            note_path = excluded.note_path,
-            block_id = excluded.block_id,
-            type = excluded.type,
-            front = excluded.front,
-            back = excluded.back,
-            irreversible = excluded.irreversible,
-            examples_json = excluded.examples_json,
-            choices_json = excluded.choices_json,
-            correct_choice_id = excluded.correct_choice_id,
-            correct_choice_ids_json = excluded.correct_choice_ids_json,
-            shuffle_choices = excluded.shuffle_choices,
-            multi_select = excluded.multi_select,
-            ease = excluded.ease,
-            interval = excluded.interval,
-            repetitions = excluded.repetitions,
-            lapses = excluded.lapses,
-            due = excluded.due,
-            suspended = excluded.suspended,
-            fsrs_stability = excluded.fsrs_stability,
-            fsrs_difficulty = excluded.fsrs_difficulty,
-            fsrs_card_json = excluded.fsrs_card_json,
-            reviews_json = excluded.reviews_json,
-            verb_stats_json = excluded.verb_stats_json,
-            updated_at = excluded.updated_at
-        """,
-        (
-            card_id,
-            normalized_path,
-            card.get("blockId", card.get("block_id")),
-            str(card.get("type", "basic") or "basic"),
-            front,
-            back,
-            BOOLEAN_TRUE if card.get("irreversible") else BOOLEAN_FALSE,
-            _sr_dump_json(card.get("examples")),
-            _sr_dump_json(card.get("choices")),
-            card.get("correctChoiceId", card.get("correct_choice_id")),
-            _sr_dump_json(card.get("correctChoiceIds", card.get("correct_choice_ids"))),
-            BOOLEAN_TRUE if card.get("shuffleChoices") or card.get("shuffle_choices") else BOOLEAN_FALSE,
-            BOOLEAN_TRUE if card.get("multiSelect") or card.get("multi_select") else BOOLEAN_FALSE,
-            _sr_float(card.get("ease"), 2.5),
-            _sr_float(card.get("interval"), 0),
-            _sr_int(card.get("repetitions"), 0),
-            _sr_int(card.get("lapses"), 0),
-            _sr_int(card.get("due"), now_ms),
-            BOOLEAN_TRUE if card.get("suspended") else BOOLEAN_FALSE,
-            _sr_optional_float(card.get("fsrsStability")),
-            _sr_optional_float(card.get("fsrsDifficulty")),
-            _sr_dump_json(card.get("fsrsCard")),
-            _sr_dump_json(card.get("reviews")),
-            _sr_dump_json(card.get("verbPrepositionStats") or card.get("verb_stats")),
-            created_at,
-            updated_at,
-        ),
+    dump = _sr_dump_json
+    row = (
+        card_id,
+        normalized_path,
+        _sr_pick(card, "blockId", "block_id"),
+        str(card_type or "basic"),
+        front,
+        back,
+        _BOOL[bool(get("irreversible"))],
+        dump(get("examples")),
+        dump(get("choices")),
+        _sr_pick(card, "correctChoiceId", "correct_choice_id"),
+        dump(_sr_pick(card, "correctChoiceIds", "correct_choice_ids")),
+        _BOOL[bool(get("shuffleChoices") or get("shuffle_choices"))],
+        _BOOL[bool(get("multiSelect") or get("multi_select"))],
+        _sr_float(get("ease"), 2.5),
+        _sr_float(get("interval"), 0),
+        _sr_int(get("repetitions"), 0),
+        _sr_int(get("lapses"), 0),
+        _sr_int(get("due"), now_ms),
+        _BOOL[bool(get("suspended"))],
+        _sr_optional_float(get("fsrsStability")),
+        _sr_optional_float(get("fsrsDifficulty")),
+        dump(get("fsrsCard")),
+        dump(get("reviews")),
+        dump(get("verbPrepositionStats") or get("verb_stats")),
+        created_at,
+        updated_at,
     )
-    conn.execute("DELETE FROM card_decks WHERE card_id = ?", (card_id,))
-    for position, did in enumerate(deck_id_candidates):
-        conn.execute(
-            "INSERT INTO card_decks (card_id, deck_id, position) VALUES (?, ?, ?)",
-            (card_id, did, position),
-        )
-    is_new = existing_row is None
-    return {
+    link_rows = [(card_id, did, position) for position, did in enumerate(deck_id_candidates)]
+    return row, link_rows, {
         "id": card_id,
         "deckIds": deck_id_candidates,
         "notePath": normalized_path,
-        "isNew": is_new,
     }
 
 def _sr_link_note_to_deck_sql(conn: sqlite3.Connection, note_path: str, deck_id: str, allow_multiple: bool) -> List[str]:
@@ -1046,14 +1413,8 @@ def _sr_link_note_to_deck_sql(conn: sqlite3.Connection, note_path: str, deck_id:
     _sr_ensure_deck(conn, deck_id)
     if not allow_multiple:
         conn.execute("DELETE FROM note_deck_links WHERE note_path = ?", (normalized,))
-    conn.execute(
-        "INSERT OR IGNORE INTO note_deck_links (note_path, deck_id) VALUES (?, ?)",
-        (normalized, deck_id),
-    )
-    rows = conn.execute(
-        "SELECT deck_id FROM note_deck_links WHERE note_path = ? ORDER BY rowid",
-        (normalized,),
-    ).fetchall()
+    conn.execute(_INSERT_NOTE_LINK_SQL, (normalized, deck_id))
+    rows = conn.execute(_NOTE_DECK_IDS_SQL, (normalized,)).fetchall()
     return [str(row["deck_id"]) for row in rows]
 
 def _sr_unlink_note_from_deck_sql(conn: sqlite3.Connection, note_path: str, deck_id: Optional[str]) -> List[str]:
@@ -1067,23 +1428,23 @@ def _sr_unlink_note_from_deck_sql(conn: sqlite3.Connection, note_path: str, deck
         )
     else:
         conn.execute("DELETE FROM note_deck_links WHERE note_path = ?", (normalized,))
-    rows = conn.execute(
-        "SELECT deck_id FROM note_deck_links WHERE note_path = ? ORDER BY rowid",
-        (normalized,),
-    ).fetchall()
+    rows = conn.execute(_NOTE_DECK_IDS_SQL, (normalized,)).fetchall()
     return [str(row["deck_id"]) for row in rows]
 
 def _sr_map_row_to_card(row: sqlite3.Row, deck_ids: List[str], include_reviews: bool) -> Dict[str, Any]:
+    # TEXT and REAL column affinity already hands back str/float for these
+    # NOT NULL columns; INTEGER columns keep int() since affinity leaves a
+    # fractional value stored there as REAL
     card: Dict[str, Any] = {
-        "id": str(row["id"]),
+        "id": row["id"],
         "deckIds": deck_ids,
         "deckId": deck_ids[0] if deck_ids else None,
-        "notePath": str(row["note_path"]),
-        "type": str(row["type"]),
-        "front": str(row["front"]),
-        "back": str(row["back"]),
-        "ease": float(row["ease"]),
-        "interval": float(row["interval"]),
+        "notePath": row["note_path"],
+        "type": row["type"],
+        "front": row["front"],
+        "back": row["back"],
+        "ease": row["ease"],
+        "interval": row["interval"],
         "repetitions": int(row["repetitions"]),
         "lapses": int(row["lapses"]),
         "due": int(row["due"]),
@@ -1092,7 +1453,7 @@ def _sr_map_row_to_card(row: sqlite3.Row, deck_ids: List[str], include_reviews:
         "updatedAt": int(row["updated_at"]),
     }
     if row["block_id"]:
-        card["blockId"] = str(row["block_id"])
+        card["blockId"] = row["block_id"]
     card["irreversible"] = bool(row["irreversible"])
     examples = _sr_parse_json(row["examples_json"])
     if examples is not None:
@@ -1101,7 +1462,7 @@ def _sr_map_row_to_card(row: sqlite3.Row, deck_ids: List[str], include_reviews:
     if choices is not None:
         card["choices"] = choices
     if row["correct_choice_id"]:
-        card["correctChoiceId"] = str(row["correct_choice_id"])
+        card["correctChoiceId"] = row["correct_choice_id"]
     correct_ids = _sr_parse_json(row["correct_choice_ids_json"])
     if correct_ids is not None:
         card["correctChoiceIds"] = correct_ids
@@ -1109,15 +1470,15 @@ def _sr_map_row_to_card(row: sqlite3.Row, deck_ids: List[str], include_reviews:
     card["multiSelect"] = bool(row["multi_select"])
     fsrs_stability = row["fsrs_stability"]
     if fsrs_stability is not None:
-        card["fsrsStability"] = float(fsrs_stability)
+        card["fsrsStability"] = fsrs_stability
     fsrs_difficulty = row["fsrs_difficulty"]
     if fsrs_difficulty is not None:
-        card["fsrsDifficulty"] = float(fsrs_difficulty)
-    fsrs_card = _sr_parse_json(row["fsrs_card_json"])
+        card["fsrsDifficulty"] = fsrs_difficulty
+    fsrs_card = _sr_parse_json_cached(row["fsrs_card_json"])
     if fsrs_card is not None:
         card["fsrsCard"] = fsrs_card
     if include_reviews:
-        reviews = _sr_parse_json(row["reviews_json"])
+        reviews = _sr_parse_json_cached(row["reviews_json"])
         if reviews is not None:
             card["reviews"] = reviews
     verb_stats = _sr_parse_json(row["verb_stats_json"])
@@ -1127,15 +1488,35 @@ def _sr_map_row_to_card(row: sqlite3.Row, deck_ids: List[str], include_reviews:
 
 def _load_settings() -> Dict[str, Any]:
     try:
-        with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(SETTINGS_PATH, "rb") as f:
+            data = f.read()
+        return orjson.loads(data) if orjson is not None else json.loads(data)
     except Exception:
         return {}
 
+def _dump_settings(st: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(st, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            pass  # e.g. non-str keys or big ints, which json.dumps still accepts
+    return json.dumps(st, ensure_ascii=False, indent=2).encode("utf-8")
+
 def _save_settings(st: Dict[str, Any]) -> None:
     try:
-        with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
-            json.dump(st, f, ensure_ascii=False, indent=2)
+        data = _dump_settings(st)
+        # The plugin also writes this file, so compare against what is on disk
+        # rather than what we wrote last
+        try:
+            with open(SETTINGS_PATH, "rb") as f:
+                if f.read() == data:
+                    return
+        except FileNotFoundError:
+            pass
+        tmp_path = SETTINGS_PATH + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, SETTINGS_PATH)  # readers never see a half-written file
     except Exception as e:
         logger.error(f"Failed to save settings: {e}")
 
@@ -1156,50 +1537,63 @@ def _sr_normalize_choices(choices: Any) -> List[Dict[str, str]]:
                 out.append({"id": cid, "text": text})
     return out
 
+# Scheduling defaults shared by every new card object
+_CARD_PROTOTYPE: Dict[str, Any] = {
+    "notePath": "",
+    "ease": 2.5,
+    "interval": 0,
+    "repetitions": 0,
+    "lapses": 0,
+    "suspended": False,
+}
+
 def _sr_create_card_objects(deck_id: str, cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # deck_id is the fallback for cards that don't carry their own deckId
     now_ms = int(time.time() * 1000)
+    js_hash = _js_style_hash
+    prototype = _CARD_PROTOTYPE
     out: List[Dict[str, Any]] = []
     for c in cards:
-        ctype = str(c.get("type", "basic")).strip() or "basic"
-        front = str(c.get("front", "")).strip()
-        back_src = c.get("back", c.get("answer", ""))
+        get = c.get
+        ctype = str(get("type", "basic")).strip() or "basic"
+        front = str(get("front", "")).strip()
+        back_src = get("back", get("answer", ""))
         back = str(back_src).strip() if back_src is not None else ""
         if not front:
             continue
         if back == "":
             back = "..."
-        cid = _js_style_hash(f"{deck_id}\n{ctype}\n{front}\n{back}")
+        card_deck = get("deckId")
+        if not isinstance(card_deck, str) or not card_deck:
+            card_deck = deck_id
+        cid = js_hash(f"{card_deck}\n{ctype}\n{front}\n{back}")
         deck_ids = []
-        if isinstance(c.get("deckIds"), list):
+        if isinstance(get("deckIds"), list):
             for entry in c["deckIds"]:
                 if isinstance(entry, str) and entry.strip():
                     deck_ids.append(entry.strip())
         if not deck_ids:
-            deck_ids = [deck_id]
-        base: Dict[str, Any] = {
-            "id": c.get("id", cid),
-            "deckId": deck_id,
+            deck_ids = [card_deck]
+        is_basic = ctype == "basic"
+        base = prototype.copy()
+        base.update({
+            "id": get("id", cid),
+            "deckId": card_deck,
             "deckIds": deck_ids,
-            "notePath": "",
             "type": ctype,
             "front": front,
             "back": back,
-            "irreversible": bool(c.get("irreversible", False)) if ctype == "basic" else False,
-            "examples": c.get("examples", []) if ctype == "basic" else c.get("examples"),
-            "ease": 2.5,
-            "interval": 0,
-            "repetitions": 0,
-            "lapses": 0,
+            "irreversible": bool(get("irreversible", False)) if is_basic else False,
+            "examples": get("examples", []) if is_basic else get("examples"),
             "due": now_ms,
-            "suspended": False,
-            "createdAt": c.get("createdAt", now_ms),
-            "updatedAt": c.get("updatedAt", now_ms),
-            "fsrsStability": c.get("fsrsStability"),
-            "fsrsDifficulty": c.get("fsrsDifficulty"),
-            "fsrsCard": c.get("fsrsCard"),
-            "reviews": c.get("reviews"),
-            "verbPrepositionStats": c.get("verbPrepositionStats"),
-        }
+            "createdAt": get("createdAt", now_ms),
+            "updatedAt": get("updatedAt", now_ms),
+            "fsrsStability": get("fsrsStability"),
+            "fsrsDifficulty": get("fsrsDifficulty"),
+            "fsrsCard": get("fsrsCard"),
+            "reviews": get("reviews"),
+            "verbPrepositionStats": get("verbPrepositionStats"),
+        })
         note_path = c.get("notePath", c.get("note_path"))
         if isinstance(note_path, str) and note_path.strip():
             base["notePath"] = _normalize_note_path(note_path)
@@ -1271,8 +1665,24 @@ def create_sr_cards(cards: List[Dict[str, Any]], deck_id: Optional[str] = None,
         ctx.info("Creating SR cards")
     created: List[str] = []
     linked_notes: Dict[str, Set[str]] = {}
+    built: List[Tuple[bool, tuple, List[tuple], Dict[str, Any]]] = []
+    enriched_cards: List[Dict[str, Any]] = []
     with _sr_connect() as conn:
         default_did = _sr_ensure_deck(conn, deck_id)
+        # Most payloads reuse a handful of decks; ensure each id/name once per call
+        ensured_ids: Dict[str, str] = {}
+        ensured_names: Dict[str, str] = {}
+
+        def ensure_id(did: str) -> str:
+            if did not in ensured_ids:
+                ensured_ids[did] = _sr_ensure_deck(conn, did)
+            return ensured_ids[did]
+
+        def ensure_name(name: str) -> str:
+            if name not in ensured_names:
+                ensured_names[name] = _sr_ensure_deck_by_name(conn, name)
+            return ensured_names[name]
+
         for raw in cards or []:
             if not isinstance(raw, dict):
                 continue
@@ -1280,33 +1690,52 @@ def create_sr_cards(cards: List[Dict[str, Any]], deck_id: Optional[str] = None,
             if isinstance(raw.get('deckIds'), list):
                 for entry in raw['deckIds']:
                     if isinstance(entry, str) and entry.strip():
-                        deck_candidates.append(_sr_ensure_deck(conn, entry.strip()))
+                        deck_candidates.append(ensure_id(entry.strip()))
             if isinstance(raw.get('deckId'), str) and raw['deckId'].strip():
-                deck_candidates.append(_sr_ensure_deck(conn, raw['deckId'].strip()))
+                deck_candidates.append(ensure_id(raw['deckId'].strip()))
             deck_name = raw.get('deck')
             if isinstance(deck_name, str) and deck_name.strip():
-                deck_candidates.append(_sr_ensure_deck_by_name(conn, deck_name.strip()))
+                deck_candidates.append(ensure_name(deck_name.strip()))
             deck_candidates = _sr_sanitize_deck_ids(deck_candidates)
             if not deck_candidates:
                 deck_candidates = [default_did]
             enriched = dict(raw)
             enriched['deckId'] = deck_candidates[0]
             enriched['deckIds'] = deck_candidates
-            card_objects = _sr_create_card_objects(deck_candidates[0], [enriched])
-            for card in card_objects:
-                card['deckIds'] = deck_candidates
-                try:
-                    result = _sr_upsert_card(conn, card)
-                except Exception as err:
-                    logger.error("Failed to upsert SR card: %s", err)
-                    continue
-                if result.get('isNew'):
-                    created.append(result['id'])
-                note_path = result.get('notePath')
-                if note_path:
-                    for did in result.get('deckIds', []):
-                        _sr_link_note_to_deck_sql(conn, note_path, did, allow_multiple=True)
-                        linked_notes.setdefault(note_path, set()).add(did)
+            enriched_cards.append(enriched)
+        for card in _sr_create_card_objects(default_did, enriched_cards):
+            try:
+                built.append((bool(card.get('id')), *_sr_card_row(card)))
+            except Exception as err:
+                logger.error("Failed to upsert SR card: %s", err)
+
+        # Write the whole payload with one executemany per table
+        known = _sr_existing_card_ids(conn, [result['id'] for _, _, _, result in built])
+        card_rows: List[tuple] = []
+        links_by_card: Dict[str, List[tuple]] = {}
+        note_links: List[Tuple[str, str]] = []
+        for has_id, row, link_rows, result in built:
+            card_id = result['id']
+            # Cards without an explicit id always counted as new
+            if not has_id or card_id not in known:
+                created.append(card_id)
+            known.add(card_id)
+            card_rows.append(row)
+            links_by_card[card_id] = link_rows  # a repeated id keeps its last deck list
+            note_path = result['notePath']
+            if note_path:
+                for did in result['deckIds']:
+                    note_links.append((note_path, did))
+                    linked_notes.setdefault(note_path, set()).add(did)
+        conn.executemany(_UPSERT_CARD_SQL, card_rows)
+        for chunk in _sr_chunks(list(links_by_card)):
+            placeholders = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM card_decks WHERE card_id IN ({placeholders})", chunk)
+        conn.executemany(
+            _INSERT_CARD_DECK_SQL,
+            [link for link_rows in links_by_card.values() for link in link_rows],
+        )
+        conn.executemany(_INSERT_NOTE_LINK_SQL, note_links)
         conn.commit()
     linked_notes_out: Dict[str, Union[str, List[str]]] = {}
     for path, ids in linked_notes.items():
@@ -1325,7 +1754,7 @@ def create_sr_cards(cards: List[Dict[str, Any]], deck_id: Optional[str] = None,
 @mcp.tool()
 def list_sr_decks(ctx: Context = None) -> Dict[str, Any]:
     """List SR decks with id, name, and card counts."""
-    with _sr_connect() as conn:
+    with _sr_connect_ro() as conn:
         rows = conn.execute(
             """
             SELECT d.id, d.name, COUNT(cd.card_id) AS count
@@ -1417,38 +1846,34 @@ def delete_sr_deck(deck_id: str, reassign_to: Optional[str] = None, ctx: Context
         target = _sr_ensure_deck(conn, reassign_to or "default", "Default")
         if deck_id == target:
             return {"status": "ok", "reassignTo": target}
-        card_rows = conn.execute(
-            "SELECT DISTINCT card_id FROM card_decks WHERE deck_id = ?",
-            (deck_id,),
-        ).fetchall()
-        for row in card_rows:
-            card_id = str(row["card_id"])
-            decks_for_card = _sr_get_deck_ids_for_card(conn, card_id)
-            decks_for_card = [did for did in decks_for_card if did != deck_id]
-            if target not in decks_for_card:
-                decks_for_card.append(target)
-            if not decks_for_card:
-                decks_for_card = [target]
-            conn.execute("DELETE FROM card_decks WHERE card_id = ?", (card_id,))
-            for position, did in enumerate(_sr_sanitize_deck_ids(decks_for_card)):
-                conn.execute(
-                    "INSERT INTO card_decks (card_id, deck_id, position) VALUES (?, ?, ?)",
-                    (card_id, did, position),
-                )
-        note_rows = conn.execute(
-            "SELECT note_path FROM note_deck_links WHERE deck_id = ?",
-            (deck_id,),
-        ).fetchall()
-        for row in note_rows:
-            note_path_norm = str(row["note_path"])
-            conn.execute(
-                "DELETE FROM note_deck_links WHERE note_path = ? AND deck_id = ?",
-                (note_path_norm, deck_id),
-            )
-            conn.execute(
-                "INSERT OR IGNORE INTO note_deck_links (note_path, deck_id) VALUES (?, ?)",
-                (note_path_norm, target),
-            )
+        # Cards keep their other decks in order; the target goes last unless
+        # the card is already in it, then positions are renumbered from 0
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO card_decks (card_id, deck_id, position)
+            SELECT cd.card_id, ?, (SELECT MAX(m.position) + 1 FROM card_decks m WHERE m.card_id = cd.card_id)
+            FROM card_decks cd WHERE cd.deck_id = ?
+            """,
+            (target, deck_id),
+        )
+        conn.execute(
+            """
+            UPDATE card_decks SET position = ranked.rn
+            FROM (
+                SELECT rowid AS rid, ROW_NUMBER() OVER (PARTITION BY card_id ORDER BY position) - 1 AS rn
+                FROM card_decks
+                WHERE deck_id != ? AND card_id IN (SELECT card_id FROM card_decks WHERE deck_id = ?)
+            ) AS ranked
+            WHERE card_decks.rowid = ranked.rid
+            """,
+            (deck_id, deck_id),
+        )
+        conn.execute("DELETE FROM card_decks WHERE deck_id = ?", (deck_id,))
+        conn.execute(
+            "INSERT OR IGNORE INTO note_deck_links (note_path, deck_id) SELECT note_path, ? FROM note_deck_links WHERE deck_id = ?",
+            (target, deck_id),
+        )
+        conn.execute("DELETE FROM note_deck_links WHERE deck_id = ?", (deck_id,))
         if deck_id != target:
             conn.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
         conn.commit()
@@ -1482,8 +1907,9 @@ def delete_sr_cards(card_ids: Optional[List[str]] = None, deck_id: Optional[str]
             for cid in card_ids:
                 if isinstance(cid, str) and cid.strip():
                     target_ids.add(cid.strip())
-        for cid in target_ids:
-            cur = conn.execute("DELETE FROM cards WHERE id = ?", (cid,))
+        for chunk in _sr_chunks(list(target_ids)):
+            placeholders = ",".join("?" * len(chunk))
+            cur = conn.execute(f"DELETE FROM cards WHERE id IN ({placeholders})", chunk)
             removed += cur.rowcount
         conn.commit()
     return {"removed": removed, "byDeck": bool(deck_id)}
@@ -1497,38 +1923,46 @@ def inspect_sr_cards(card_ids: Optional[List[str]] = None,
                      ctx: Context = None) -> Dict[str, Any]:
     if ctx:
         ctx.info("Inspecting SR cards and schema")
-    with _sr_connect() as conn:
-        rows: List[sqlite3.Row] = []
+    # reviews_json is usually the largest column; leave it in SQLite unless asked for
+    columns = "c.*" if include_reviews else _CARD_COLUMNS_NO_REVIEWS
+    cards_out: List[Dict[str, Any]] = []
+    with _sr_connect_ro() as conn:
+        cursor: Optional[sqlite3.Cursor] = None
         if card_ids:
             ids = [cid for cid in card_ids if isinstance(cid, str) and cid.strip()]
             if ids:
                 placeholders = ",".join(["?"] * len(ids))
-                rows = conn.execute(
-                    f"SELECT * FROM cards WHERE id IN ({placeholders}) ORDER BY updated_at DESC",
+                cursor = conn.execute(
+                    f"SELECT {columns} FROM cards c WHERE id IN ({placeholders}) ORDER BY updated_at DESC",
                     ids,
-                ).fetchall()
+                )
         else:
             if deck_id:
-                rows = conn.execute(
-                    """
-                    SELECT c.* FROM cards c
+                cursor = conn.execute(
+                    f"""
+                    SELECT {columns} FROM cards c
                     INNER JOIN card_decks cd ON cd.card_id = c.id
                     WHERE cd.deck_id = ?
-                    ORDER BY c.updated_at DESC
+                    ORDER BY c.updated_at DESC, cd.rowid
                     LIMIT ?
                     """,
                     (deck_id, max(1, int(limit))),
-                ).fetchall()
+                )
             else:
-                rows = conn.execute(
-                    "SELECT * FROM cards ORDER BY updated_at DESC LIMIT ?",
+                cursor = conn.execute(
+                    f"SELECT {columns} FROM cards c ORDER BY updated_at DESC, c.rowid LIMIT ?",
                     (max(1, int(limit)),),
-                ).fetchall()
-        cards_out: List[Dict[str, Any]] = []
-        for row in rows:
-            deck_ids_for_card = _sr_get_deck_ids_for_card(conn, str(row["id"]))
-            cards_out.append(_sr_map_row_to_card(row, deck_ids_for_card, include_reviews))
-        conn.commit()
+                )
+        # Map one chunk of rows at a time so the sqlite3.Row objects for the
+        # whole result never sit in memory next to the output dicts
+        while cursor is not None:
+            rows = cursor.fetchmany(_SR_IN_CHUNK)
+            if not rows:
+                break
+            deck_map = _sr_get_deck_ids_for_cards(conn, [str(row["id"]) for row in rows])
+            for row in rows:
+                deck_ids_for_card = deck_map.get(str(row["id"]), [])
+                cards_out.append(_sr_map_row_to_card(row, deck_ids_for_card, include_reviews))
     schema: Optional[Dict[str, Any]] = None
     if include_schema:
         schema = {
@@ -1588,29 +2022,32 @@ def get_thoughts_stats() -> str:
     """
     logger.info("Getting thoughts statistics")
     
-    # Get all markdown files in the thoughts directory
-    md_files = list(Path(THOUGHTS_DIR).glob("**/*.md"))
+    # Count the notes, from the build's index file when it is up to date
+    total_thoughts = _count_thoughts()
     
     # Get embedding info if available
     title_embedding_count = 0
     thought_embedding_count = 0
     
-    if _ensure_embeddings_exist():
-        # Load embeddings to get counts
-        title_embeddings = load_embeddings(TITLE_EMBEDDINGS_FILE)
-        thought_embeddings = load_embeddings(BODY_EMBEDDINGS_FILE)
+    embeddings_ready = _ensure_embeddings_exist()
+    if embeddings_ready:
+        import search_thoughts
         
-        title_embedding_count = len(title_embeddings)
-        thought_embedding_count = len(thought_embeddings)
+        # Row counts of the matrices the searches use (memory-mapped from the
+        # .npy sidecars and cached per file, so usually nothing is read)
+        title_embedding_count = len(search_thoughts.load_embedding_matrix(TITLE_EMBEDDINGS_FILE)[0])
+        thought_embedding_count = len(search_thoughts.load_embedding_matrix(BODY_EMBEDDINGS_FILE)[0])
     
     stats = {
-        "total_thoughts": len(md_files),
+        "total_thoughts": total_thoughts,
         "title_embeddings": title_embedding_count,
         "content_embeddings": thought_embedding_count,
         "thoughts_directory": THOUGHTS_DIR,
-        "embeddings_ready": _ensure_embeddings_exist()
+        "embeddings_ready": embeddings_ready
     }
     
+    if orjson is not None:
+        return orjson.dumps(stats, option=orjson.OPT_INDENT_2).decode()
     return json.dumps(stats, indent=2)
 
 
@@ -1634,6 +2071,7 @@ This MCP server provides access to your thoughts collection through semantic sea
 - **keyword_search**: Search thoughts by exact text matches (only use when explicitly requested)
 - **get_thought_content**: Get the full content of a specific thought
 - **compare_thoughts**: Compare two thoughts and calculate their similarity
+- **compare_thoughts_batch**: Compare many pairs of thoughts in one call
 - **list_recent_thoughts**: List the most recently modified thought files
 - **write_note**: Write a new note to your Obsidian vault
 
@@ -12,12 +12,30 @@ import sys
 import json
 import csv
 import argparse
+import concurrent.futures
 import numpy as np
 from pathlib import Path
 import requests
 import re
+import tempfile
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Tuple, Optional
 
+try:
+    import simsimd
+except ImportError:  # optional, SIMD kernels for pairwise cosine similarity
+    simsimd = None
+
+try:
+    import faiss
+except ImportError:  # optional, approximate nearest-neighbour search (USE_ANN=1)
+    faiss = None
+
+try:
+    import orjson
+except ImportError:  # optional, faster decoding of the CSV embedding column
+    orjson = None
+
 # Default settings - override these with environment variables if needed
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "mxbai-embed-large:latest")
@@ -26,6 +44,25 @@ EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "mxbai-embed-large:latest")
 BODY_EMBEDDINGS_FILE = "thoughts_embedding/thought_embeddings.csv"
 TITLE_EMBEDDINGS_FILE = "thoughts_embedding/title_embeddings.csv"
 
+# Search an HNSW index instead of scanning every embedding (needs faiss)
+USE_ANN = os.environ.get("USE_ANN", "") == "1"
+# Below this many rows a full scan is as fast as HNSW and exact, so skip the index
+ANN_MIN_ROWS = int(os.environ.get("ANN_MIN_ROWS", "5000"))
+
+# Scan int8-quantized embeddings (4x less memory traffic) instead of float32
+USE_INT8 = os.environ.get("USE_INT8", "") == "1"
+
+# Scan float16 copies of the embeddings (half the memory traffic) instead of float32
+USE_FP16 = os.environ.get("USE_FP16", "") == "1"
+
+# (connect, read) timeouts in seconds for Ollama requests
+REQUEST_TIMEOUT = (10, 300)
+
+# Shared HTTP session so the tags probe and the query embeds reuse one
+# keep-alive connection instead of opening a new one per call
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=8))
+
 # Thoughts directory for reference
 THOUGHTS_DIR = "/Users/aidanlowrie/Library/Mobile Documents/iCloud~md~obsidian/Documents/My Brain/1 - Thoughts"
 
@@ -35,23 +72,23 @@ def embed_text(text: str, model: str = EMBEDDING_MODEL) -> Optional[List[float]]
     if not text.strip():
         return None
     
-    url = f"{OLLAMA_BASE_URL}/api/embeddings"
+    url = f"{OLLAMA_BASE_URL}/api/embed"
     
     payload = {
         "model": model,
-        "prompt": text
+        "input": [text]
     }
     
     try:
-        response = requests.post(url, json=payload)
+        response = _SESSION.post(url, json=payload, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         
-        if "embedding" not in data:
+        if not data.get("embeddings"):
             print(f"Error: No embedding in response: {data}")
             return None
             
-        return data["embedding"]
+        return data["embeddings"][0]
     except Exception as e:
         print(f"Error generating embedding: {e}")
         return None
@@ -61,40 +98,53 @@ def cosine_similarity(v1: List[float], v2: List[float]) -> float:
     """
     Calculate cosine similarity between two vectors
     """
-    if not v1 or not v2 or len(v1) != len(v2):
+    if v1 is None or v2 is None or len(v1) == 0 or len(v1) != len(v2):
         return 0.0
     
-    # Convert to numpy arrays
-    v1_np = np.array(v1)
-    v2_np = np.array(v2)
+    if simsimd is not None:
+        a = np.asarray(v1, dtype=np.float32)
+        b = np.asarray(v2, dtype=np.float32)
+        if not a.any() or not b.any():
+            return 0.0
+        # simsimd returns the cosine distance
+        return float(1.0 - simsimd.cosine(a, b))
+    
+    # Convert to numpy arrays once
+    a = np.asarray(v1, dtype=np.float32)
+    b = np.asarray(v2, dtype=np.float32)
     
-    # Calculate dot product and norms
-    dot_product = np.dot(v1_np, v2_np)
-    norm_v1 = np.linalg.norm(v1_np)
-    norm_v2 = np.linalg.norm(v2_np)
+    # Product of the squared norms, so a single sqrt covers both
+    denominator = np.vdot(a, a) * np.vdot(b, b)
     
     # Avoid division by zero
-    if norm_v1 == 0 or norm_v2 == 0:
+    if denominator == 0:
         return 0.0
     
     # Return cosine similarity
-    return dot_product / (norm_v1 * norm_v2)
+    return float(np.dot(a, b) / np.sqrt(denominator))
 
 
 def load_embeddings(csv_path: str) -> Dict[str, List[float]]:
     """Load embeddings from CSV file"""
     embeddings = {}
+    loads = orjson.loads if orjson is not None else json.loads
     
     try:
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader)  # Skip header
+        with open(csv_path, 'rb') as f:
+            f.readline()  # Skip header
             
-            for row in reader:
-                if len(row) == 2:
-                    file_path, embedding_json = row
-                    embedding = json.loads(embedding_json)
-                    embeddings[file_path] = embedding
+            for line in f:
+                # Rows are `path,"[...]"`; the vector never contains a quote, so
+                # it can be sliced out without going through csv.reader. Quoted
+                # paths (with a comma or quote in them) still take the csv route.
+                start = line.rfind(b',"[')
+                end = line.rfind(b']"')
+                if line.startswith(b'"') or start < 0 or end < start:
+                    row = next(csv.reader([line.decode('utf-8')]), [])
+                    if len(row) == 2:
+                        embeddings[row[0]] = loads(row[1])
+                    continue
+                embeddings[line[:start].decode('utf-8')] = loads(line[start + 2:end + 1])
         
         print(f"Loaded {len(embeddings)} embeddings from {csv_path}")
         return embeddings
@@ -103,6 +153,246 @@ def load_embeddings(csv_path: str) -> Dict[str, List[float]]:
         return {}
 
 
+# (mtime, file paths, L2-normalized float32 matrix with one row per path)
+_MATRIX_CACHE: Dict[str, Tuple[float, List[str], np.ndarray]] = {}
+
+
+def load_npy_sidecar(csv_path: str, csv_mtime: Optional[float]) -> Optional[Tuple[List[str], np.ndarray]]:
+    """Memory-map the <base>.npy / .paths.txt pair next to an embeddings CSV
+
+    Returns None unless the pair exists, is at least as new as the CSV, and
+    its .meta.json says the rows are L2-normalized.
+    """
+    base = os.path.splitext(csv_path)[0]
+    npy_file, paths_file, meta_file = base + ".npy", base + ".paths.txt", base + ".meta.json"
+    try:
+        if csv_mtime is None or os.path.getmtime(npy_file) < csv_mtime:
+            return None
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            if not json.load(f).get("normalized"):
+                return None
+        matrix = np.load(npy_file, mmap_mode='r')
+        with open(paths_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except (OSError, ValueError):
+        return None
+    paths = text.split('\n') if text else []
+    if matrix.ndim != 2 or matrix.dtype != np.float32 or len(paths) != len(matrix):
+        return None
+    return paths, matrix
+
+
+def load_embedding_matrix(csv_path: str) -> Tuple[List[str], np.ndarray]:
+    """Load embeddings as (file paths, L2-normalized float32 matrix)
+
+    The result is kept in memory and reused until the CSV file changes, so
+    repeated searches skip the CSV/JSON parsing entirely.
+    """
+    try:
+        mtime = os.path.getmtime(csv_path)
+    except OSError:
+        mtime = None
+    cached = _MATRIX_CACHE.get(csv_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    
+    # Prefer the normalized .npy written by build_embeddings: it is memory-mapped,
+    # so loading is instant and every process shares the same page-cache pages
+    sidecar = load_npy_sidecar(csv_path, mtime)
+    if sidecar is not None:
+        paths, matrix = sidecar
+        _MATRIX_CACHE[csv_path] = (mtime, paths, matrix)
+        return paths, matrix
+    
+    embeddings = load_embeddings(csv_path)
+    if not embeddings:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    
+    # Every row must have the same dimension to form a matrix
+    dim = len(next(iter(embeddings.values())))
+    paths = [path for path, embedding in embeddings.items() if len(embedding) == dim]
+    if len(paths) != len(embeddings):
+        print(f"Skipping {len(embeddings) - len(paths)} embeddings without {dim} dimensions")
+    matrix = np.array([embeddings[path] for path in paths], dtype=np.float32)
+    
+    # Normalize once so each search is a single matrix-vector product
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    
+    if mtime is not None:
+        _MATRIX_CACHE[csv_path] = (mtime, paths, matrix)
+    return paths, matrix
+
+
+# HNSW indexes already loaded in this process, keyed by CSV path: (mtime, index)
+_ANN_CACHE: Dict[str, Tuple[float, object]] = {}
+
+
+def load_ann_index(csv_path: str, matrix: np.ndarray):
+    """Return a faiss HNSW inner-product index over `matrix`, or None without faiss
+    or when `matrix` has fewer than ANN_MIN_ROWS rows (a full scan is used then)
+
+    The index is persisted next to the CSV as <csv>.hnsw and rebuilt when the
+    CSV is newer or the row count no longer matches.
+    """
+    if faiss is None or len(matrix) == 0 or len(matrix) < ANN_MIN_ROWS:
+        return None
+    mtime = os.path.getmtime(csv_path)
+    cached = _ANN_CACHE.get(csv_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    
+    index_file = csv_path + ".hnsw"
+    index = None
+    if os.path.exists(index_file) and os.path.getmtime(index_file) >= mtime:
+        index = faiss.read_index(index_file)
+        if index.ntotal != len(matrix) or index.d != matrix.shape[1]:
+            index = None
+    if index is None:
+        print(f"Building HNSW index for {csv_path}")
+        index = faiss.IndexHNSWFlat(matrix.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+        index.add(np.ascontiguousarray(matrix, dtype=np.float32))
+        faiss.write_index(index, index_file)
+    
+    _ANN_CACHE[csv_path] = (mtime, index)
+    return index
+
+
+def quantize_int8(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row so its largest component is +-127 and round to int8"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        return quantize_int8(matrix.reshape(1, -1))[0]
+    scale = 127.0 / np.maximum(np.abs(matrix).max(axis=1, keepdims=True), 1e-12)
+    return np.rint(matrix * scale).astype(np.int8)
+
+
+# Converted matrices already mapped in this process, keyed by sidecar path: (CSV mtime, matrix)
+_CONVERTED_CACHE: Dict[str, Tuple[float, np.ndarray]] = {}
+
+
+def _load_converted_matrix(csv_path: str, matrix: np.ndarray, suffix: str, convert) -> np.ndarray:
+    """Return convert(matrix), memory-mapped from the <csv><suffix> sidecar
+
+    The sidecar is written on first use and rewritten when the CSV is newer.
+    """
+    sidecar = os.path.splitext(csv_path)[0] + suffix
+    mtime = os.path.getmtime(csv_path)
+    cached = _CONVERTED_CACHE.get(sidecar)
+    if cached is not None and cached[0] == mtime and cached[1].shape == matrix.shape:
+        return cached[1]
+    
+    converted = None
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= mtime:
+        converted = np.load(sidecar, mmap_mode='r')
+        if converted.shape != matrix.shape:
+            converted = None
+    if converted is None:
+        # Write a private temp file and rename it into place, so another
+        # process never maps a half-written sidecar or has its mapping rewritten
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(sidecar) or ".",
+                                        prefix=os.path.basename(sidecar) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, convert(matrix))
+            os.replace(tmp_file, sidecar)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        converted = np.load(sidecar, mmap_mode='r')
+    
+    _CONVERTED_CACHE[sidecar] = (mtime, converted)
+    return converted
+
+
+def load_int8_matrix(csv_path: str, matrix: np.ndarray) -> np.ndarray:
+    """Return the int8-quantized version of `matrix`, memory-mapped from <csv>.i8.npy
+
+    Only the direction of each row is kept; that is all cosine similarity needs.
+    """
+    return _load_converted_matrix(csv_path, matrix, ".i8.npy", quantize_int8)
+
+
+def load_fp16_matrix(csv_path: str, matrix: np.ndarray) -> np.ndarray:
+    """Return the float16 version of `matrix`, memory-mapped from <csv>.f16.npy
+
+    float16 keeps about three significant digits, well within what separates
+    neighbouring cosine scores for ranking.
+    """
+    return _load_converted_matrix(csv_path, matrix, ".f16.npy",
+                                  lambda m: np.asarray(m, dtype=np.float16))
+
+
+# Numba-compiled int8 scoring kernel: None until first needed, False without numba
+_I8_KERNEL = None
+
+
+def _numba_i8_kernel():
+    """Return the int8 cosine kernel, compiling it on first use, or None without numba
+
+    numba is imported here rather than at module load, since importing it
+    costs a few hundred milliseconds that only the int8 fallback pays back.
+    """
+    global _I8_KERNEL
+    if _I8_KERNEL is None:
+        try:
+            from numba import njit, prange
+        except ImportError:  # optional, compiled int8 scoring when simsimd is missing
+            _I8_KERNEL = False
+            return None
+        
+        @njit(parallel=True, fastmath=True, cache=True)
+        def kernel(query, matrix, out):
+            # Integer dot products and norms straight from the int8 rows, one row per thread
+            query_norm = 0
+            for j in range(query.shape[0]):
+                query_norm += np.int32(query[j]) * np.int32(query[j])
+            for i in prange(matrix.shape[0]):
+                dot = 0
+                norm = 0
+                for j in range(matrix.shape[1]):
+                    value = np.int32(matrix[i, j])
+                    dot += value * np.int32(query[j])
+                    norm += value * value
+                denominator = np.sqrt(np.float64(norm) * query_norm)
+                out[i] = dot / denominator if denominator > 0 else 0.0
+        
+        _I8_KERNEL = kernel
+    return _I8_KERNEL or None
+
+
+def cosine_similarity_i8(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of an int8 query vector with every row of an int8 matrix"""
+    if simsimd is not None:
+        distances = simsimd.cdist(query.reshape(1, -1), matrix, metric="cosine")
+        return 1.0 - np.asarray(distances, dtype=np.float32).reshape(-1)
+    kernel = _numba_i8_kernel()
+    if kernel is not None:
+        scores = np.empty(len(matrix), dtype=np.float32)
+        kernel(np.ascontiguousarray(query), np.asarray(matrix), scores)
+        return scores
+    # numpy has no int8 GEMV that can't overflow, so widen block by block
+    query = query.astype(np.float32)
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), 4096):
+        block = np.asarray(matrix[start:start + 4096], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1) * np.linalg.norm(query)
+        scores[start:start + 4096] = (block @ query) / np.maximum(norms, 1e-12)
+    return scores
+
+
+def cosine_similarity_f16(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity of a normalized float32 query with every row of a float16 matrix"""
+    if simsimd is not None:
+        distances = simsimd.cdist(query.astype(np.float16).reshape(1, -1), matrix, metric="cosine")
+        return 1.0 - np.asarray(distances, dtype=np.float32).reshape(-1)
+    # numpy has no float16 GEMV (it would loop in C without BLAS), so widen
+    # block by block; the rows are normalized, so a dot product is the cosine
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), 4096):
+        scores[start:start + 4096] = np.asarray(matrix[start:start + 4096], dtype=np.float32) @ query
+    return scores
+
+
 def get_document_content(file_path: str) -> str:
     """Read the content of a markdown file"""
     try:
@@ -135,24 +425,71 @@ def search_thoughts(query: str, max_results: int = 1, use_titles: bool = False)
     
     # Load the appropriate embeddings
     embeddings_file = TITLE_EMBEDDINGS_FILE if use_titles else BODY_EMBEDDINGS_FILE
-    document_embeddings = load_embeddings(embeddings_file)
+    paths, matrix = load_embedding_matrix(embeddings_file)
     
-    if not document_embeddings:
+    if not paths:
         print(f"No embeddings found in {embeddings_file}")
         return []
     
-    # Calculate similarity with all documents
-    similarities = []
+    index = load_ann_index(embeddings_file, matrix) if USE_ANN else None
+    if USE_INT8 and index is None:
+        matrix = load_int8_matrix(embeddings_file, matrix)
+    elif USE_FP16 and index is None:
+        matrix = load_fp16_matrix(embeddings_file, matrix)
+    return search_preloaded(query_embedding, matrix, paths, max_results, index)
+
+
+def search_preloaded(query_embedding, matrix: np.ndarray, paths: List[str], max_results: int,
+                     index=None) -> List[Tuple[str, float]]:
+    """
+    Rank already-loaded embeddings against a query embedding
     
-    for file_path, embedding in document_embeddings.items():
-        similarity = cosine_similarity(query_embedding, embedding)
-        similarities.append((file_path, similarity))
+    Args:
+        query_embedding: Embedding of the query (list or array)
+        matrix: L2-normalized embedding matrix from load_embedding_matrix(), or its
+            int8 or float16 version from load_int8_matrix() / load_fp16_matrix()
+        paths: File path for each row of `matrix`
+        max_results: Maximum number of results to return
+        index: Optional HNSW index from load_ann_index() to search instead of `matrix`
+        
+    Returns:
+        List of tuples with (file_path, similarity_score)
+    """
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
+    if len(paths) == 0:
+        return []
+    if query_vector.shape[0] != matrix.shape[1]:
+        print(f"Query embedding has {query_vector.shape[0]} dimensions, expected {matrix.shape[1]}")
+        return []
+    
+    query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+    k = min(max_results, len(paths))
+    if k <= 0:
+        return []
     
-    # Sort by similarity (highest first)
-    similarities.sort(key=lambda x: x[1], reverse=True)
+    # Approximate search: walk the HNSW graph instead of scoring every row
+    if index is not None:
+        faiss.ParameterSpace().set_index_parameter(index, "efSearch", max(64, k))
+        distances, ids = index.search(query_vector.reshape(1, -1), k)
+        return [(paths[i], float(d)) for d, i in zip(distances[0], ids[0]) if i >= 0]
     
-    # Return top results
-    return similarities[:max_results]
+    if matrix.dtype == np.int8:
+        scores = cosine_similarity_i8(quantize_int8(query_vector), matrix)
+    elif matrix.dtype == np.float16:
+        scores = cosine_similarity_f16(query_vector, matrix)
+    else:
+        # Cosine similarity with all documents at once (rows are pre-normalized)
+        scores = matrix @ query_vector
+    
+    # Select the top results without sorting every score; when every row is
+    # returned anyway, skip the partition and just sort
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+    else:
+        top = np.argsort(-scores, kind="stable")
+    
+    return [(paths[i], float(scores[i])) for i in top]
 
 
 def print_results(results: List[Tuple[str, float]], show_content: bool = True) -> None:
@@ -161,12 +498,18 @@ def print_results(results: List[Tuple[str, float]], show_content: bool = True) -
         print("No matching documents found")
         return
     
-    for i, (file_path, similarity) in enumerate(results):
-        print(f"\n{i+1}. {file_path} (Similarity: {similarity:.4f})")
-        
-        if show_content:
+    if not show_content:
+        for i, (file_path, similarity) in enumerate(results):
+            print(f"\n{i+1}. {file_path} (Similarity: {similarity:.4f})")
+        return
+    
+    # Read the files concurrently; map() yields in order, so each result
+    # prints as soon as it and the ones before it are read
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(results))) as executor:
+        contents = executor.map(get_document_content, [file_path for file_path, _ in results])
+        for i, ((file_path, similarity), content) in enumerate(zip(results, contents)):
+            print(f"\n{i+1}. {file_path} (Similarity: {similarity:.4f})")
             print("\n" + "="*80 + "\n")
-            content = get_document_content(file_path)
             print(content)
             print("\n" + "="*80)
 
@@ -208,7 +551,7 @@ def main():
     
     # Check if Ollama API is accessible
     try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags")
+        response = _SESSION.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         print("Successfully connected to Ollama API")
     except Exception as e:
@@ -0,0 +1,16 @@
+from pathlib import Path
+
+import mcp_server
+
+
+def test_md_walk_matches_glob_and_skips_symlinked_dirs(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "c").mkdir()
+    for name in ["z.md", "a/one.md", "a/b/two.md", "c/three.md", "a/notes.txt"]:
+        (tmp_path / name).write_text("hi")
+    (tmp_path / "a" / "loop").symlink_to("..")
+    (tmp_path / "a" / "clink").symlink_to("../c")
+
+    found = [entry.path for entry in mcp_server._iter_md_entries(str(tmp_path))]
+    assert found == [str(p) for p in tmp_path.glob("**/*.md")]
+    assert len(found) == 4
@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+
+import search_thoughts
+
+
+def test_converted_sidecar_is_replaced_not_rewritten(tmp_path):
+    csv_path = tmp_path / "body.csv"
+    csv_path.write_text("file_path,embedding\n")
+    matrix = np.eye(3, dtype=np.float32)
+
+    # A stale sidecar that another process may still have mapped
+    sidecar = tmp_path / "body.f16.npy"
+    np.save(sidecar, np.zeros((2, 3), dtype=np.float16))
+    os.utime(sidecar, (0, 0))
+    stale = np.load(sidecar, mmap_mode="r")
+
+    converted = search_thoughts.load_fp16_matrix(str(csv_path), matrix)
+    assert converted.dtype == np.float16
+    assert np.array_equal(converted, matrix)
+    assert stale.shape == (2, 3) and not stale.any()  # the old mapping is untouched
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["body.csv", "body.f16.npy"]
@@ -0,0 +1,120 @@
+import importlib.util
+
+import pytest
+
+import mcp_server
+
+
+def _tool(name):
+    tool = getattr(mcp_server, name)
+    return getattr(tool, "fn", tool)
+
+
+@pytest.fixture
+def sr_store(tmp_path, monkeypatch):
+    """Point the SR store at a fresh AUTO_TAGGER_PLUGIN_DIR."""
+    mcp_server._sr_close()
+    monkeypatch.setattr(mcp_server, "PLUGIN_DIR", str(tmp_path))
+    monkeypatch.setattr(mcp_server, "SR_DB_PATH", str(tmp_path / "spaced_repetition.sqlite"))
+    monkeypatch.setattr(mcp_server, "SETTINGS_PATH", str(tmp_path / "data.json"))
+    yield tmp_path
+    mcp_server._sr_close()
+
+
+def _card_decks(card_id):
+    with mcp_server._sr_connect() as conn:
+        rows = conn.execute(
+            "SELECT deck_id, position FROM card_decks WHERE card_id = ? ORDER BY position", (card_id,)
+        ).fetchall()
+    return [(row["deck_id"], row["position"]) for row in rows]
+
+
+@pytest.mark.skipif(mcp_server._jsh is None, reason="numba is not installed")
+@pytest.mark.parametrize("text", ["", "deck/note.md::What is a card?", "𝄞 clef 😀 — é"])
+def test_card_id_hash_matches_python_loop(monkeypatch, text):
+    compiled = mcp_server._js_style_hash(text)
+    monkeypatch.setattr(mcp_server, "_jsh", None)
+    assert compiled == mcp_server._js_style_hash(text)
+    assert len(compiled) == len("card_") + 8
+
+
+def test_card_id_hash_when_loaded_from_a_file_path():
+    # How fastmcp run / mcp install load the server: not registered in sys.modules
+    spec = importlib.util.spec_from_file_location("server_module", mcp_server.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module._js_style_hash("abc") == mcp_server._js_style_hash("abc") == "card_00017862"
+
+
+def test_created_ids_only_count_new_cards(sr_store):
+    create = _tool("create_sr_cards")
+    first = create([{"front": "Q1", "back": "A1"}, {"id": "fixed", "front": "Q2", "back": "A2"}])
+    assert first["createdCount"] == 2
+    assert first["createdIds"][1] == "fixed"
+
+    again = create([
+        {"front": "Q1", "back": "A1"},
+        {"id": "fixed", "front": "Q2 edited", "back": "A2"},
+        {"id": "fresh", "front": "Q3"},
+        {"id": "fresh", "front": "Q3 again"},
+    ])
+    assert again["createdIds"] == ["fresh"]
+    cards = _tool("inspect_sr_cards")(card_ids=["fixed", "fresh"], include_schema=False)["cards"]
+    assert {card["id"]: card["front"] for card in cards} == {"fixed": "Q2 edited", "fresh": "Q3 again"}
+
+
+def test_repeated_id_keeps_last_deck_list(sr_store):
+    _tool("create_sr_cards")([
+        {"id": "dup", "front": "Q", "deckIds": ["a", "b"]},
+        {"id": "dup", "front": "Q", "deckIds": ["c", "a"]},
+    ])
+    assert _card_decks("dup") == [("c", 0), ("a", 1)]
+
+
+def test_delete_deck_reassigns_and_renumbers(sr_store):
+    _tool("create_sr_cards")([
+        {"id": "first", "front": "Q1", "deckIds": ["gone", "x"]},
+        {"id": "middle", "front": "Q2", "deckIds": ["x", "gone", "y"]},
+        {"id": "has-target", "front": "Q3", "deckIds": ["target", "gone"]},
+        {"id": "untouched", "front": "Q4", "deckIds": ["x", "y"]},
+        {"id": "noted", "front": "Q5", "deckIds": ["gone"], "notePath": "n.md"},
+    ])
+    assert _tool("delete_sr_deck")("gone", reassign_to="target") == {"status": "ok", "reassignTo": "target"}
+
+    assert _card_decks("first") == [("x", 0), ("target", 1)]
+    assert _card_decks("middle") == [("x", 0), ("y", 1), ("target", 2)]
+    assert _card_decks("has-target") == [("target", 0)]
+    assert _card_decks("untouched") == [("x", 0), ("y", 1)]
+    assert _card_decks("noted") == [("target", 0)]
+    with mcp_server._sr_connect() as conn:
+        assert not conn.execute("SELECT 1 FROM decks WHERE id = 'gone'").fetchone()
+        links = conn.execute("SELECT deck_id FROM note_deck_links WHERE note_path = 'n.md'").fetchall()
+    assert [row["deck_id"] for row in links] == ["target"]
+
+
+def test_delete_cards_past_the_in_chunk_size(sr_store):
+    count = mcp_server._SR_IN_CHUNK * 2 + 5
+    ids = _tool("create_sr_cards")([{"front": f"Q{i}"} for i in range(count)], deck_id="big")["createdIds"]
+    assert len(ids) == count
+
+    result = _tool("delete_sr_cards")(card_ids=ids + ["missing"])
+    assert result == {"removed": count, "byDeck": False}
+    with mcp_server._sr_connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM card_decks").fetchone()[0] == 0
+
+
+def test_old_sqlite_is_rejected(sr_store, monkeypatch):
+    monkeypatch.setattr(mcp_server.sqlite3, "sqlite_version_info", (3, 31, 1))
+    with pytest.raises(RuntimeError, match="SQLite 3.33"):
+        _tool("list_sr_decks")()
+
+
+def test_redundant_card_index_is_dropped(sr_store):
+    with mcp_server._sr_connect() as conn:
+        conn.execute("CREATE INDEX idx_card_decks_card ON card_decks(card_id)")
+    mcp_server._sr_close()
+    with mcp_server._sr_connect() as conn:
+        names = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "idx_card_decks_card" not in names
+    assert "idx_card_decks_card_position" in names